@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from niftytdms import TdmsDataType, TdmsExtractArray, TdmsExtractAuto, TdmsNumpyDtype
+
+
+# =================================================================================================
+# Raw Channel Decoding Benchmark: per-sample TdmsExtractAuto loop vs. TdmsExtractArray
+# =================================================================================================
+
+BENCH_TYPES = [
+  TdmsDataType.tdsTypeI8,
+  TdmsDataType.tdsTypeI16,
+  TdmsDataType.tdsTypeI32,
+  TdmsDataType.tdsTypeI64,
+  TdmsDataType.tdsTypeU8,
+  TdmsDataType.tdsTypeU16,
+  TdmsDataType.tdsTypeU32,
+  TdmsDataType.tdsTypeU64,
+  TdmsDataType.tdsTypeSingleFloat,
+  TdmsDataType.tdsTypeDoubleFloat,
+  TdmsDataType.tdsTypeBoolean,
+]
+
+
+def DecodeLoop(tdms_datatype, tdms_bytestream, count, endianness):
+  obj_data = []
+  scan_ind = 0
+  for _ in range(count):
+    data, scan_ind = TdmsExtractAuto(tdms_datatype, tdms_bytestream, start_ind=scan_ind, endianness=endianness)
+    obj_data.append(data)
+  return obj_data
+
+
+def DecodeArray(tdms_datatype, tdms_bytestream, count, endianness):
+  obj_data, _ = TdmsExtractArray(tdms_datatype, tdms_bytestream, start_ind=0, count=count, endianness=endianness)
+  return obj_data
+
+
+def MakeBytestream(tdms_datatype, count, endianness):
+  rng = np.random.default_rng(0)
+  dtype = TdmsNumpyDtype(tdms_datatype, endianness)
+  if dtype.kind == 'f':
+    values = rng.standard_normal(count)
+  else:
+    values = rng.integers(0, 2 if tdms_datatype == TdmsDataType.tdsTypeBoolean else 100, count)
+  return values.astype(dtype).tobytes()
+
+
+def TimeIt(func, *args, repeat=3):
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func(*args)
+    best = min(best, time.perf_counter() - start)
+  return best
+
+
+def RunBenchmark(count):
+  print(f"{'data type':<22}{'endian':<8}{'loop [s]':>12}{'array [s]':>12}{'speedup':>10}")
+  for tdms_datatype in BENCH_TYPES:
+    for endianness in ('little', 'big'):
+      tdms_bytestream = MakeBytestream(tdms_datatype, count, endianness)
+      loop_data = DecodeLoop(tdms_datatype, tdms_bytestream, count, endianness)
+      array_data = DecodeArray(tdms_datatype, tdms_bytestream, count, endianness)
+      if loop_data != array_data.tolist():
+        raise ValueError(f"Decoded data mismatch for {tdms_datatype.name} ({endianness})")
+
+      loop_time = TimeIt(DecodeLoop, tdms_datatype, tdms_bytestream, count, endianness, repeat=1)
+      array_time = TimeIt(DecodeArray, tdms_datatype, tdms_bytestream, count, endianness)
+      print(f"{tdms_datatype.name:<22}{endianness:<8}{loop_time:>12.4f}{array_time:>12.6f}{loop_time/array_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+  RunBenchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
@@ -0,0 +1,118 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from niftytdms import TdmsDataType, TdmsLoadFile, TdmsOpenFile
+from tdms_synth import WriteSynthFile
+
+
+# =================================================================================================
+# File Loading Benchmark: synthetic TDMS files through every load path
+# =================================================================================================
+
+NUMERIC_TYPES = (TdmsDataType.tdsTypeDoubleFloat, TdmsDataType.tdsTypeI32, TdmsDataType.tdsTypeU16, TdmsDataType.tdsTypeSingleFloat)
+
+# samples are per channel per segment and get multiplied by --scale
+BENCH_SCENARIOS = {
+  'many_small_segments':  dict(num_segments=2000, num_channels=8,   samples=100),
+  'few_large_segments':   dict(num_segments=10,   num_channels=8,   samples=200000),
+  'wide_segments':        dict(num_segments=50,   num_channels=200, samples=1000),
+  'mixed_numeric':        dict(num_segments=200,  num_channels=16,  samples=5000, data_types=NUMERIC_TYPES),
+  'interleaved':          dict(num_segments=200,  num_channels=16,  samples=5000, data_types=NUMERIC_TYPES, interleaved=True),
+  'interleaved_big':      dict(num_segments=200,  num_channels=16,  samples=5000, data_types=NUMERIC_TYPES, interleaved=True, endianness='big'),
+  'raw_only_segments':    dict(num_segments=1000, num_channels=8,   samples=1000, raw_only=True),
+  'timestamps':           dict(num_segments=100,  num_channels=4,   samples=20000, data_types=(TdmsDataType.tdsTypeTimeStamp, TdmsDataType.tdsTypeDoubleFloat)),
+  'strings':              dict(num_segments=100,  num_channels=4,   samples=5000, data_types=(TdmsDataType.tdsTypeString, TdmsDataType.tdsTypeI32)),
+}
+
+
+def LoadEager(filepath):
+  TdmsLoadFile(filepath)
+
+
+def LoadThreaded(filepath):
+  TdmsLoadFile(filepath, workers=os.cpu_count() or 1)
+
+
+def LoadOneChannel(filepath):
+  TdmsLoadFile(filepath, channels=['ch0'])
+
+
+def OpenMetadata(filepath):
+  with TdmsOpenFile(filepath, use_index=False):
+    pass
+
+
+def IterOneChannel(filepath):
+  with TdmsOpenFile(filepath, use_index=False) as tdms_file:
+    for _ in tdms_file.iter_channel('Synthetic', 'ch0', chunk_size=100000):
+      pass
+
+
+# load path -> (function, number of channels it decodes: 'all', 1 or 0)
+LOAD_PATHS = {
+  'TdmsLoadFile':           (LoadEager,       'all'),
+  'TdmsLoadFile(workers)':  (LoadThreaded,    'all'),
+  'TdmsLoadFile(ch0)':      (LoadOneChannel,  1),
+  'TdmsOpenFile':           (OpenMetadata,    0),
+  'iter_channel(ch0)':      (IterOneChannel,  1),
+}
+
+
+def TimeIt(func, *args, repeat=3):
+  best = float('inf')
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func(*args)
+    best = min(best, time.perf_counter() - start)
+  return best
+
+
+def PeakMemory(func, *args):
+  tracemalloc.start()
+  try:
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return peak
+
+
+def RunScenario(name, scenario, scale, load_paths, repeat, tmp_dir):
+  scenario = dict(scenario)
+  scenario['samples'] = max(1, int(scenario['samples']*scale))
+  filepath = os.path.join(tmp_dir, name + '.tdms')
+  num_samples = WriteSynthFile(filepath, **scenario)
+  file_mb = os.path.getsize(filepath) / 1e6
+
+  print(f"\n{name}: {scenario['num_segments']} segments x {scenario['num_channels']} channels x {scenario['samples']} samples, {file_mb:.1f} MB")
+  print(f"  {'load path':<24}{'time [s]':>10}{'MB/s':>10}{'Msamples/s':>12}{'peak [MB]':>11}")
+  for path_name in load_paths:
+    load_func, decoded_channels = LOAD_PATHS[path_name]
+    load_time = TimeIt(load_func, filepath, repeat=repeat)
+    peak_mb = PeakMemory(load_func, filepath) / 1e6
+
+    decoded_samples = num_samples if decoded_channels == 'all' else num_samples // scenario['num_channels'] * decoded_channels
+    samples_rate = f"{decoded_samples/load_time/1e6:>12.2f}" if decoded_samples > 0 else f"{'-':>12}"
+    print(f"  {path_name:<24}{load_time:>10.4f}{file_mb/load_time:>10.1f}{samples_rate}{peak_mb:>11.1f}")
+  os.remove(filepath)
+
+
+def RunBenchmark(scenarios, scale, load_paths, repeat):
+  with tempfile.TemporaryDirectory() as tmp_dir:
+    for name in scenarios:
+      RunScenario(name, BENCH_SCENARIOS[name], scale, load_paths, repeat, tmp_dir)
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description='Benchmark TDMS load paths on synthetic files')
+  parser.add_argument('--scenario', action='append', choices=sorted(BENCH_SCENARIOS), help='run only this scenario (repeatable)')
+  parser.add_argument('--path', action='append', choices=list(LOAD_PATHS), help='run only this load path (repeatable)')
+  parser.add_argument('--scale', type=float, default=1.0, help='multiplier for samples per segment')
+  parser.add_argument('--repeat', type=int, default=3, help='timing runs per load path, the best is reported')
+  args = parser.parse_args()
+  RunBenchmark(args.scenario or list(BENCH_SCENARIOS), args.scale, args.path or list(LOAD_PATHS), args.repeat)
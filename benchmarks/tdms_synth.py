@@ -0,0 +1,161 @@
+import os
+import struct
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from niftytdms import TdmsDataType, TdmsDataTypeIsNumpy, TdmsEpochOffset, TdmsNumpyDtype
+
+
+# =================================================================================================
+# Synthetic TDMS File Generator
+# =================================================================================================
+
+SYNTH_WORDS = ['alpha', 'beta', 'gamma', 'delta', 'GM12-J1-FRQ7', 'Debug', '', 'µs-step']
+
+TOC_META_DATA       = (1 << 1)
+TOC_NEW_OBJ_LIST    = (1 << 2)
+TOC_RAW_DATA        = (1 << 3)
+TOC_INTERLEAVED     = (1 << 5)
+TOC_BIG_ENDIAN      = (1 << 6)
+
+
+def TimeDtype(endianness):
+  if endianness == 'big':
+    return np.dtype([('seconds', '>i8'), ('fraction', '>u8')])
+  return np.dtype([('fraction', '<u8'), ('seconds', '<i8')])
+
+
+def SynthValues(rng, tdms_datatype, count, segment_ind):
+  if tdms_datatype == TdmsDataType.tdsTypeString:
+    return [SYNTH_WORDS[i] for i in rng.integers(0, len(SYNTH_WORDS), count)]
+  if tdms_datatype == TdmsDataType.tdsTypeTimeStamp:
+    seconds = TdmsEpochOffset + 1700000000 + segment_ind*count + np.arange(count)
+    fraction = rng.integers(0, 2**63, count, dtype=np.uint64)
+    return seconds, fraction
+  if tdms_datatype == TdmsDataType.tdsTypeBoolean:
+    return rng.integers(0, 2, count)
+  if np.dtype(TdmsNumpyDtype(tdms_datatype, 'little')).kind == 'f':
+    return rng.standard_normal(count)
+  return rng.integers(0, 100, count)
+
+
+def FixedWidthDtype(tdms_datatype, endianness):
+  if tdms_datatype == TdmsDataType.tdsTypeTimeStamp:
+    return TimeDtype(endianness)
+  return TdmsNumpyDtype(tdms_datatype, endianness)
+
+
+def FixedWidthArray(tdms_datatype, values, endianness):
+  if tdms_datatype == TdmsDataType.tdsTypeTimeStamp:
+    seconds, fraction = values
+    time_array = np.empty(len(seconds), dtype=TimeDtype(endianness))
+    time_array['seconds']  = seconds
+    time_array['fraction'] = fraction
+    return time_array
+  return np.asarray(values).astype(TdmsNumpyDtype(tdms_datatype, endianness))
+
+
+def StringBytes(values, endianness):
+  value_bytes = [value.encode('utf-8') for value in values]
+  end_offsets = np.cumsum([len(value) for value in value_bytes], dtype=np.int64)
+  return end_offsets.astype(('>' if endianness == 'big' else '<') + 'u4').tobytes() + b''.join(value_bytes)
+
+
+def PackString(value, byte_order):
+  value_bytes = value.encode('utf-8')
+  return struct.pack(byte_order + 'I', len(value_bytes)) + value_bytes
+
+
+def SegmentMetadata(channels, channel_values, samples, byte_order, with_props):
+  objs = []
+  root_props = struct.pack(byte_order + 'I', 1) + PackString('name', byte_order) + struct.pack(byte_order + 'I', 0x20) + PackString('synthetic', byte_order)
+  objs.append(PackString('/', byte_order) + struct.pack(byte_order + 'I', 0xFFFFFFFF) + (root_props if with_props else struct.pack(byte_order + 'I', 0)))
+  objs.append(PackString("/'Synthetic'", byte_order) + struct.pack(byte_order + 'II', 0xFFFFFFFF, 0))
+
+  for (channel_name, tdms_datatype), values in zip(channels, channel_values):
+    obj = PackString("/'Synthetic'/'" + channel_name + "'", byte_order)
+    if tdms_datatype == TdmsDataType.tdsTypeString:
+      total_size = len(StringBytes(values, 'little'))
+      obj += struct.pack(byte_order + 'IIIQQ', 28, tdms_datatype.value, 1, samples, total_size)
+    else:
+      obj += struct.pack(byte_order + 'IIIQ', 20, tdms_datatype.value, 1, samples)
+    objs.append(obj + struct.pack(byte_order + 'I', 0))
+
+  return struct.pack(byte_order + 'I', len(objs)) + b''.join(objs)
+
+
+def SegmentRawData(channels, channel_values, samples, interleaved, endianness):
+  if not interleaved:
+    raw_parts = []
+    for (_, tdms_datatype), values in zip(channels, channel_values):
+      if tdms_datatype == TdmsDataType.tdsTypeString:
+        raw_parts.append(StringBytes(values, endianness))
+      else:
+        raw_parts.append(FixedWidthArray(tdms_datatype, values, endianness).tobytes())
+    return b''.join(raw_parts)
+
+  row_dtype = np.dtype([('f' + str(i), FixedWidthDtype(tdms_datatype, endianness)) for i, (_, tdms_datatype) in enumerate(channels)])
+  rows = np.empty(samples, dtype=row_dtype)
+  for i, ((_, tdms_datatype), values) in enumerate(zip(channels, channel_values)):
+    rows['f' + str(i)] = FixedWidthArray(tdms_datatype, values, endianness)
+  return rows.tobytes()
+
+
+def SynthChannels(num_channels, data_types):
+  return [('ch' + str(i), data_types[i % len(data_types)]) for i in range(num_channels)]
+
+
+def SynthSegmentValues(channels, num_segments, samples, seed):
+  rng = np.random.default_rng(seed)
+  for segment_ind in range(num_segments):
+    yield [SynthValues(rng, tdms_datatype, samples, segment_ind) for _, tdms_datatype in channels]
+
+
+def SynthChannelValues(num_segments=100, num_channels=8, samples=10000, data_types=(TdmsDataType.tdsTypeDoubleFloat,), seed=0):
+  # the values WriteSynthFile writes for the same arguments, as one list of per-segment values per channel
+  channels = SynthChannels(num_channels, data_types)
+  channel_values = {channel_name: [] for channel_name, _ in channels}
+  for segment_values in SynthSegmentValues(channels, num_segments, samples, seed):
+    for (channel_name, _), values in zip(channels, segment_values):
+      channel_values[channel_name].append(values)
+  return channels, channel_values
+
+
+def WriteSynthFile(filepath, num_segments=100, num_channels=8, samples=10000, data_types=(TdmsDataType.tdsTypeDoubleFloat,),
+                   interleaved=False, endianness='little', raw_only=False, seed=0):
+  channels = SynthChannels(num_channels, data_types)
+  if interleaved and any(tdms_datatype == TdmsDataType.tdsTypeString for _, tdms_datatype in channels):
+    raise ValueError("String channels cannot be interleaved")
+  for _, tdms_datatype in channels:
+    if tdms_datatype not in (TdmsDataType.tdsTypeString, TdmsDataType.tdsTypeTimeStamp) and not TdmsDataTypeIsNumpy(tdms_datatype):
+      raise ValueError("Unsupported synthetic data type: " + tdms_datatype.name)
+
+  byte_order = '>' if endianness == 'big' else '<'
+  num_samples = 0
+  with open(filepath, 'wb') as file:
+    for segment_ind, channel_values in enumerate(SynthSegmentValues(channels, num_segments, samples, seed)):
+      has_strings = any(tdms_datatype == TdmsDataType.tdsTypeString for _, tdms_datatype in channels)
+
+      # raw-only segments reuse the previous layout, which string sizes would break
+      write_meta = segment_ind == 0 or not raw_only or has_strings
+      meta = SegmentMetadata(channels, channel_values, samples, byte_order, with_props=segment_ind == 0) if write_meta else b''
+      raw = SegmentRawData(channels, channel_values, samples, interleaved, endianness)
+
+      toc_mask = TOC_RAW_DATA
+      toc_mask |= (TOC_META_DATA | TOC_NEW_OBJ_LIST) if write_meta else 0
+      toc_mask |= TOC_INTERLEAVED if interleaved else 0
+      toc_mask |= TOC_BIG_ENDIAN if endianness == 'big' else 0
+
+      file.write(b'TDSm' + struct.pack('<I', toc_mask) + struct.pack(byte_order + 'IQQ', 4713, len(meta) + len(raw), len(meta)))
+      file.write(meta)
+      file.write(raw)
+      num_samples += samples*num_channels
+  return num_samples
+
+
+if __name__ == '__main__':
+  out_path = sys.argv[1] if len(sys.argv) > 1 else 'synthetic.tdms'
+  total_samples = WriteSynthFile(out_path)
+  print(f"wrote {out_path}: {total_samples} samples, {os.path.getsize(out_path)/1e6:.1f} MB")
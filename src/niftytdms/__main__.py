@@ -0,0 +1,54 @@
+import argparse
+import os
+import sys
+
+from .niftytdms import TdmsBuildPyramid, TdmsConvertBatchSize, TdmsConvertFile, TdmsConvertFormats, TdmsDefragmentFile
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(prog='niftytdms')
+  commands = parser.add_subparsers(dest='command')
+  commands.required = True
+
+  convert = commands.add_parser('convert', help='convert TDMS files to one Parquet or Arrow file per group')
+  convert.add_argument('inputs', nargs='+', help='TDMS files to convert')
+  convert.add_argument('-o', '--out-dir', default='.', help='directory for the converted files')
+  convert.add_argument('-f', '--format', choices=sorted(TdmsConvertFormats), default='parquet')
+  convert.add_argument('--batch-size', type=int, default=TdmsConvertBatchSize, help='rows per record batch')
+  convert.add_argument('--group', action='append', dest='groups', help='only convert this group (repeatable)')
+  convert.add_argument('--channel', action='append', dest='channels', help='only convert this channel (repeatable)')
+
+  defragment = commands.add_parser('defragment', help='rewrite TDMS files as one metadata block and one contiguous run per channel')
+  defragment.add_argument('inputs', nargs='+', help='TDMS files to defragment')
+  defragment.add_argument('-o', '--out-dir', help='directory for the defragmented files, replaces the inputs if not given')
+  defragment.add_argument('--index', action='store_true', help='also write a .tdms_index file')
+  defragment.add_argument('--chunk-size', type=int, default=1000000, help='values per channel held in memory at once')
+
+  pyramid = commands.add_parser('pyramid', help='build the min/max/mean decimation pyramid cache next to TDMS files')
+  pyramid.add_argument('inputs', nargs='+', help='TDMS files to summarise')
+  pyramid.add_argument('--bin-size', type=int, help='samples per bin in the finest level')
+  pyramid.add_argument('--factor', type=int, help='bins merged into one between levels')
+
+  args = parser.parse_args(argv)
+  if args.command == 'convert':
+    for filepath in args.inputs:
+      out_paths = TdmsConvertFile(filepath, args.out_dir, file_format=args.format, batch_size=args.batch_size,
+                                  groups=args.groups, channels=args.channels)
+      for out_path in out_paths.values():
+        print(out_path)
+
+  elif args.command == 'defragment':
+    for filepath in args.inputs:
+      out_path = os.path.join(args.out_dir, os.path.basename(filepath)) if args.out_dir is not None else None
+      if out_path is not None:
+        os.makedirs(args.out_dir, exist_ok=True)
+      print(TdmsDefragmentFile(filepath, out_path=out_path, chunk_size=args.chunk_size, write_index=args.index))
+
+  elif args.command == 'pyramid':
+    for filepath in args.inputs:
+      print(TdmsBuildPyramid(filepath, bin_size=args.bin_size, factor=args.factor))
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -1,6 +1,19 @@
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from enum import Enum
+import hashlib
+import json
+import mmap
+import os
 import struct
+import tempfile
+import threading
+import time
+import traceback
+
+import numpy as np
 
 
 # =================================================================================================
@@ -64,6 +77,7 @@ class TdmsObject:
     self.raw_data_ind   = 0
     self.num_props      = 0
     self.props          = {}
+    self.prop_types     = {}
     self.raw_data_type  = TdmsDataType.tdsTypeVoid
     self.raw_data_dim   = 0
     self.raw_data_num   = 0
@@ -88,6 +102,25 @@ class TdmsObjTemplate:
     self.raw_data_size = raw_data_size
 
 
+class TdmsDataBlock:
+  def __init__(self, raw_start, raw_data_type, raw_data_num, raw_size, endianness, stride=0):
+    self.raw_start      = raw_start
+    self.raw_data_type  = raw_data_type
+    self.raw_data_num   = raw_data_num
+    self.raw_size       = raw_size
+    self.endianness     = endianness
+    self.stride         = stride      # bytes between consecutive values, 0 if variable length
+
+
+class TdmsSegmentLayout:
+  def __init__(self):
+    self.objs         = {}
+    self.blocks       = {}    # raw_start of each block is its offset within a chunk
+    self.chunk_size   = 0
+    self.interleaved  = False
+    self.endianness   = 'little'
+
+
 class TdmsSegment:
   def __init__(self):
     self.version    = 0
@@ -95,10 +128,13 @@ class TdmsSegment:
     self.end        = 0
     self.len        = 0
     self.raw_start  = 0
+    self.meta_start = 0
+    self.meta_end   = 0
     self.seg_path   = ""
     self.num_objs   = 0
     self.objs       = {}
     self.settings   = None
+    self.blocks     = {}
     self.data       = {}
 
   def __str__(self):
@@ -123,12 +159,100 @@ class TdmsRoot:
 class TdmsGroup:
   def __init__(self):
     self.name           = ""
+    self.path           = ""      # object path as written in the file, the name is its cleaned form
     self.data           = []
     self.props          = {}
+    self.prop_types     = {}      # TDMS data type of every property, kept so files can be rewritten unchanged
     self.channels       = []
     self.channel_data   = {}
     self.channel_props  = {}
 
+  def to_dataframe(self, time_index=False):
+    return TdmsGroupToDataFrame(self, time_index=time_index)
+
+
+
+class TdmsStringArray:
+  def __init__(self, buffer=b'', offsets=None):
+    self.buffer   = buffer
+    self.offsets  = np.zeros(1, dtype=np.int64) if offsets is None else offsets   # string i is buffer[offsets[i]:offsets[i+1]]
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def __iter__(self):
+    for i in range(len(self)):
+      yield self[i]
+
+  def __repr__(self):
+    return "TdmsStringArray(" + repr(self.tolist()) + ")"
+
+  def __getitem__(self, key):
+    if isinstance(key, (int, np.integer)):
+      value_ind = key + len(self) if key < 0 else key
+      if not 0 <= value_ind < len(self):
+        raise IndexError("String index out of range")
+      return str(self.buffer[self.offsets[value_ind]:self.offsets[value_ind+1]], 'utf-8')
+
+    if isinstance(key, slice):
+      start, stop, step = key.indices(len(self))
+      if step == 1:  # contiguous slices share the byte buffer
+        return TdmsStringArray(self.buffer, self.offsets[start:max(start, stop)+1])
+      return self.Take(np.arange(start, stop, step))
+
+    key = np.asarray(key)
+    if key.dtype == bool:
+      key = np.flatnonzero(key)
+    return self.Take(key)
+
+  def tolist(self):
+    return list(self)
+
+  def lengths(self):
+    return np.diff(self.offsets)
+
+  def Take(self, indices):
+    starts    = self.offsets[:-1][indices]
+    lengths   = self.offsets[1:][indices] - starts
+    offsets   = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    byte_inds = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+    return TdmsStringArray(np.frombuffer(self.buffer, dtype=np.uint8)[byte_inds].tobytes(), offsets)
+
+  def MatchPrefix(self, value_bytes, exact):
+    lengths = self.lengths()
+    if exact:
+      mask = lengths == len(value_bytes)
+    else:
+      mask = lengths >= len(value_bytes)
+    if len(value_bytes) == 0:
+      return mask
+
+    candidates  = np.flatnonzero(mask)
+    byte_inds   = self.offsets[:-1][candidates, None] + np.arange(len(value_bytes))
+    buffer      = np.frombuffer(self.buffer, dtype=np.uint8)
+    mask[candidates] = np.all(buffer[byte_inds] == np.frombuffer(value_bytes, dtype=np.uint8), axis=1)
+    return mask
+
+  def equals(self, value):
+    return self.MatchPrefix(value.encode('utf-8'), exact=True)
+
+  def startswith(self, prefix):
+    return self.MatchPrefix(prefix.encode('utf-8'), exact=False)
+
+  @staticmethod
+  def Concatenate(string_arrays):
+    buffers = []
+    offsets = [np.zeros(1, dtype=np.int64)]
+    buffer_len = 0
+    for string_array in string_arrays:
+      first, last = int(string_array.offsets[0]), int(string_array.offsets[-1])
+      buffers.append(string_array.buffer[first:last])
+      offsets.append(string_array.offsets[1:] - first + buffer_len)
+      buffer_len += last - first
+    return TdmsStringArray(b''.join(buffers), np.concatenate(offsets))
+
 
 
 # =================================================================================================
@@ -142,9 +266,18 @@ class TdmsFileUtil:
     root.props.update(props)
 
 
+  @staticmethod
+  def TdmsDataToList(data):
+    if isinstance(data, np.ndarray):
+      if data.dtype.kind in 'MV':   # tolist() would turn timestamps into plain integers or tuples
+        return list(data)
+      return data.tolist()
+    return data
+
+
   @staticmethod
   def TdmsRootAddData(root, data):
-    root.data += data
+    root.data += TdmsFileUtil.TdmsDataToList(data)
 
 
   @staticmethod
@@ -155,6 +288,11 @@ class TdmsFileUtil:
     return root.groups[group_name]
   
 
+  @staticmethod
+  def TdmsRootDropEmptyGroups(root):
+    root.groups = {group_name: group for group_name, group in root.groups.items() if len(group.channels) > 0}
+
+
   @staticmethod
   def TdmsGroupAddProps(group, props):
     group.props.update(props)
@@ -162,7 +300,7 @@ class TdmsFileUtil:
 
   @staticmethod
   def TdmsGroupAddData(group, data):
-    group.data += data
+    group.data += TdmsFileUtil.TdmsDataToList(data)
   
 
   @staticmethod
@@ -178,7 +316,10 @@ class TdmsFileUtil:
     if channel_name not in group.channels:
       TdmsFileUtil.TdmsGroupAddChannel(group, channel_name)
 
-    group.channel_data[channel_name] += channel_data
+    if len(group.channel_data[channel_name]) == 0:
+      group.channel_data[channel_name] = channel_data
+    else:
+      group.channel_data[channel_name] = TdmsFileUtil.TdmsConcatData([group.channel_data[channel_name], channel_data])
   
   @staticmethod
   def TdmsGroupAddChannelProps(group, channel_name, channel_props):
@@ -188,26 +329,209 @@ class TdmsFileUtil:
     group.channel_props[channel_name].update(channel_props)
 
 
+  @staticmethod
+  def TdmsConcatData(data_parts):
+    if len(data_parts) == 0:
+      return []
+    if all(isinstance(data, np.ndarray) for data in data_parts):
+      return np.concatenate(data_parts)
+    if all(isinstance(data, TdmsStringArray) for data in data_parts):
+      return TdmsStringArray.Concatenate(data_parts)
+
+    concat_data = []
+    for data in data_parts:
+      concat_data += TdmsFileUtil.TdmsDataToList(data)
+    return concat_data
+
+
+  @staticmethod
+  def TdmsFileFetchGroup(tdms_file, group_name):
+    if group_name not in tdms_file.groups:
+      group = TdmsGroup()
+      group.name = group_name
+      group.channel_data = TdmsLazyChannelData()
+      tdms_file.groups[group_name] = group
+    return tdms_file.groups[group_name]
+
+
+  @staticmethod
+  def TdmsFileFetchChannel(tdms_file, group_name, channel_name):
+    group = TdmsFileUtil.TdmsFileFetchGroup(tdms_file, group_name)
+    if channel_name not in group.channels:
+      channel = TdmsChannel(tdms_file, group_name, channel_name)
+      group.channels.append(channel_name)
+      group.channel_data.channels[channel_name] = channel
+      group.channel_props[channel_name] = channel.props
+    return group.channel_data.channels[channel_name]
+
+
+  @staticmethod
+  def TdmsFileToRoot(tdms_file, groups=None, channels=None):
+    root = TdmsRoot()
+    TdmsFileUtil.TdmsRootAddProps(root, tdms_file.props)
+    for group_name, file_group in tdms_file.groups.items():
+      if not TdmsObjectSelected(group_name, groups=groups, channels=channels):
+        continue
+      group = TdmsFileUtil.TdmsRootFetchGroup(root, group_name)
+      TdmsFileUtil.TdmsGroupAddProps(group, file_group.props)
+      for channel_name in file_group.channels:
+        if not TdmsObjectSelected(group_name, channel_name, groups=groups, channels=channels):
+          continue
+        TdmsFileUtil.TdmsGroupAddChannel(group, channel_name)
+        TdmsFileUtil.TdmsGroupAddChannelProps(group, channel_name, file_group.channel_props[channel_name])
+        group.channel_data[channel_name] = file_group.channel_data[channel_name]
+
+    if channels is not None:
+      TdmsFileUtil.TdmsRootDropEmptyGroups(root)
+    return root
+
+
+  @staticmethod
+  def TdmsChannelAddBlock(channel, block):
+    channel.raw_data_type = block.raw_data_type
+    channel.blocks.append(block)
+    channel.num_values += block.raw_data_num
+    channel.block_ends = None
+
+
+  @staticmethod
+  def TdmsBlockSlice(block, start, count):
+    if TdsmDataLenIsVariable(block.raw_data_type):
+      return None
+
+    value_size = TdmsDataTypeSize(block.raw_data_type)
+    raw_size = (count - 1)*block.stride + value_size if count > 0 else 0
+    return TdmsDataBlock(block.raw_start + start*block.stride, block.raw_data_type, count, raw_size, block.endianness, stride=block.stride)
+
+
+
+# =================================================================================================
+# TDMS Loader Instrumentation
+# =================================================================================================
+
+class TdmsLoaderStats:
+  def __init__(self, segment_callbacks=()):
+    self.timers             = {}
+    self.counters           = {}
+    self.samples            = {}
+    self.segment_callbacks  = list(segment_callbacks)
+    self.active_phases      = set()
+    self.lock               = threading.Lock()
+
+  def AddTime(self, phase, seconds):
+    with self.lock:
+      self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+  def Count(self, counter, amount=1):
+    with self.lock:
+      self.counters[counter] = self.counters.get(counter, 0) + amount
+
+  def CountSamples(self, blocks):
+    with self.lock:
+      for block in blocks:
+        type_name = block.raw_data_type.name
+        self.samples[type_name] = self.samples.get(type_name, 0) + block.raw_data_num
+
+  def CountSegment(self, seg):
+    self.Count('segments')
+    self.Count('segment_bytes', seg.len)
+    self.Count('meta_bytes', seg.meta_end - seg.meta_start)
+    self.Count('raw_bytes', seg.end - seg.raw_start)
+    if not seg.settings.meta_in_seg:
+      self.Count('raw_only_segments')
+    for callback in self.segment_callbacks:
+      callback(seg, self)
+
+  def Wrap(self, phase, func, on_result=None):
+    def TimedFunc(*args, **kwargs):
+      if phase in self.active_phases:   # nested calls are already inside this phase's timer
+        return func(*args, **kwargs)
+
+      self.active_phases.add(phase)
+      phase_start = time.perf_counter()
+      try:
+        result = func(*args, **kwargs)
+      finally:
+        self.AddTime(phase, time.perf_counter() - phase_start)
+        self.active_phases.discard(phase)
+      if on_result is not None:
+        on_result(args, result)
+      return result
+    return TimedFunc
+
+  def to_dict(self):
+    with self.lock:
+      return {'timers': dict(self.timers), 'counters': dict(self.counters), 'samples': dict(self.samples)}
+
+
 
 # =================================================================================================
 # TDMS File Loader Class
 # =================================================================================================
 
 class TdmsLoader:
-  def __init__(self):
+  def __init__(self, raw_timestamps=False, groups=None, channels=None, stats=None):
+    self.raw_timestamps = raw_timestamps
+    self.groups = groups
+    self.channels = channels
     self.obj_templates = {}
+    self.clean_paths = {}
+    self.selected_paths = {}
+    self.layout = None
     self.root = None
+    self.stats = stats
+    if stats is not None:
+      self.Instrument(stats)
+
+
+  def Instrument(self, stats):
+    # timed wrappers shadow the methods on this instance only, so uninstrumented loaders pay nothing
+    stats_on_decode = {
+      'LoadDataBlock':          lambda args, result: stats.CountSamples([args[2]]),
+      'LoadChannelBlocks':      lambda args, result: stats.CountSamples([block for blocks in args[1].values() for block in blocks]),
+      'LoadInterleavedBlocks':  lambda args, result: stats.CountSamples([args[1].blocks[path][0] for path in result]),
+    }
+    for method_name, on_result in stats_on_decode.items():
+      setattr(self, method_name, stats.Wrap('decode', getattr(self, method_name), on_result))
+
+    self.ValidateSegment    = stats.Wrap('validate', self.ValidateSegment)
+    self.LoadObject         = stats.Wrap('metadata', self.LoadObject, lambda args, result: (stats.Count('objects'), stats.Count('props', len(result[0].props))))
+    self.CreateCleanPath    = stats.Wrap('clean_path', self.CreateCleanPath, lambda args, result: stats.Count('clean_paths'))
+    self.BuildSegmentLayout = stats.Wrap('layout', self.BuildSegmentLayout, lambda args, result: stats.Count('layouts'))
+    self.ScanSegment        = stats.Wrap('scan', self.ScanSegment, lambda args, result: stats.CountSegment(result))
+    self.SegmentToTdms      = stats.Wrap('merge', self.SegmentToTdms)
+    self.ObjectDataToTdms   = stats.Wrap('merge', self.ObjectDataToTdms)
+    self.SegmentToIndex     = stats.Wrap('merge', self.SegmentToIndex)
+    self.LoadBytestream     = stats.Wrap('load', self.LoadBytestream)
+    self.ScanBytestream     = stats.Wrap('index', self.ScanBytestream)
+
+
+  def CreateCleanPath(self, obj_path):
+    return TdmsCreateCleanPath(obj_path)
+
+
+  def FetchCleanPath(self, obj_path):
+    if obj_path not in self.clean_paths:
+      self.clean_paths[obj_path] = self.CreateCleanPath(obj_path)
+    return self.clean_paths[obj_path]
+
+
+  def PathSelected(self, clean_path):
+    if clean_path not in self.selected_paths:
+      path_parts = clean_path.split('-') if len(clean_path) > 0 else [None]
+      self.selected_paths[clean_path] = TdmsObjectSelected(*path_parts, groups=self.groups, channels=self.channels)
+    return self.selected_paths[clean_path]
 
 
   def CreateObjTemplate(self, obj_path, raw_data_ind, raw_data_type, raw_data_dim, raw_data_num, raw_data_size):
-    clean_path = TdmsCreateCleanPath(obj_path)
+    clean_path = self.FetchCleanPath(obj_path)
     obj_template = TdmsObjTemplate(obj_path, clean_path, raw_data_ind, raw_data_type, raw_data_dim, raw_data_num, raw_data_size)
     self.obj_templates[clean_path] = obj_template
     return
 
 
   def FetchObjTemplate(self, obj_path):
-    clean_path = TdmsCreateCleanPath(obj_path)
+    clean_path = self.FetchCleanPath(obj_path)
     if clean_path not in self.obj_templates:
       return None
     return self.obj_templates[clean_path]
@@ -217,7 +541,7 @@ class TdmsLoader:
     obj = TdmsObject()
     obj_path_len, scan_ind      = TdmsExtractU32(tdms_bytestream, start_ind=start_ind, endianness=endianness)
     obj.path, scan_ind          = TdmsExtractString(tdms_bytestream, start_ind=scan_ind, str_len=obj_path_len)
-    obj.clean_path              = TdmsCreateCleanPath(obj.path)
+    obj.clean_path              = self.FetchCleanPath(obj.path)
 
     obj.raw_data_ind, scan_ind  = TdmsExtractU32(tdms_bytestream, start_ind=scan_ind, endianness=endianness)
     no_raw_data = 0xFFFFFFFF
@@ -229,8 +553,7 @@ class TdmsLoader:
       if TdsmDataLenIsVariable(obj.raw_data_type):
         obj.raw_data_size, scan_ind = TdmsExtractU64(tdms_bytestream, start_ind=scan_ind, endianness=endianness)
       
-      if self.FetchObjTemplate(obj.path) == None:
-        self.CreateObjTemplate(obj.path, obj.raw_data_ind, obj.raw_data_type, obj.raw_data_dim, obj.raw_data_num, obj.raw_data_size)
+      self.CreateObjTemplate(obj.path, obj.raw_data_ind, obj.raw_data_type, obj.raw_data_dim, obj.raw_data_num, obj.raw_data_size)
 
     elif obj.raw_data_ind == 0:
       obj_template      = self.FetchObjTemplate(obj.path)
@@ -247,100 +570,1391 @@ class TdmsLoader:
       prop_datatype, scan_ind   = TdmsExtractDataType(tdms_bytestream, start_ind=scan_ind, endianness=endianness)
       prop_value, scan_ind      = TdmsExtractAuto(prop_datatype, tdms_bytestream, start_ind=scan_ind, endianness=endianness)
       obj.props[prop_name] = prop_value
+      obj.prop_types[prop_name] = prop_datatype
     
     return obj, scan_ind
   
 
-  def LoadObjectRawData(self, tdms_bytestream, start_ind, obj, endianness):
+  def LoadRawData(self, tdms_bytestream, start_ind, raw_data_type, raw_data_num, endianness, stride=0):
     obj_data = []
     scan_ind = start_ind
 
+    if raw_data_type == TdmsDataType.tdsTypeString:
+      obj_data, scan_ind = TdmsExtractStringArray(tdms_bytestream, start_ind=scan_ind, count=raw_data_num, endianness=endianness)
+    elif TdmsDataTypeIsNumpy(raw_data_type):
+      obj_data, scan_ind = TdmsExtractArray(raw_data_type, tdms_bytestream, start_ind=scan_ind, count=raw_data_num, endianness=endianness, stride=stride)
+    elif raw_data_type == TdmsDataType.tdsTypeTimeStamp:
+      obj_data, scan_ind = TdmsExtractTimeArray(tdms_bytestream, start_ind=scan_ind, count=raw_data_num, endianness=endianness, stride=stride)
+      if not self.raw_timestamps:
+        obj_data = TdmsTimeArrayToDatetime64(obj_data)
+    else:
+      for i in range(raw_data_num):
+        if stride:
+          scan_ind = start_ind + i*stride
+        data, scan_ind = TdmsExtractAuto(raw_data_type, tdms_bytestream, start_ind=scan_ind, endianness=endianness)
+        obj_data.append(data)
+
+    return obj_data, scan_ind
+
+
+  def LoadObjectRawData(self, tdms_bytestream, start_ind, obj, endianness):
     if obj.raw_data_ind == 0xFFFFFFFF:
-      return obj_data, scan_ind
+      return [], start_ind
 
-    if obj.raw_data_type == TdmsDataType.tdsTypeString:
-      str_lens = []
-      for _ in range(obj.raw_data_num):
-        str_len, scan_ind = TdmsExtractU32(tdms_bytestream, start_ind=scan_ind, endianness=endianness)
-        str_lens.append(str_len)
+    return self.LoadRawData(tdms_bytestream, start_ind, obj.raw_data_type, obj.raw_data_num, endianness)
+
+
+  def LoadDataBlock(self, tdms_bytestream, start_ind, block):
+    obj_data, _ = self.LoadRawData(tdms_bytestream, start_ind, block.raw_data_type, block.raw_data_num, block.endianness, stride=block.stride)
+    return obj_data
+
+
+  def BuildSegmentLayout(self, objs, settings):
+    layout = TdmsSegmentLayout()
+    layout.objs         = objs
+    layout.interleaved  = settings.data_interleaved
+    layout.endianness   = settings.endianness
+
+    raw_objs = [obj for obj in objs.values() if obj.raw_data_ind != 0xFFFFFFFF]
+    raw_ind = 0
+
+    if settings.data_interleaved:  # one value of every object per row
+      row_size = sum(TdmsDataTypeSize(obj.raw_data_type) for obj in raw_objs)
+      for obj in raw_objs:
+        value_size = TdmsDataTypeSize(obj.raw_data_type)
+        raw_size = (obj.raw_data_num - 1)*row_size + value_size if obj.raw_data_num > 0 else 0
+        layout.blocks[obj.clean_path] = TdmsDataBlock(raw_ind, obj.raw_data_type, obj.raw_data_num, raw_size, settings.endianness, stride=row_size)
+        raw_ind += value_size
+      layout.chunk_size = row_size*raw_objs[0].raw_data_num if len(raw_objs) > 0 else 0
 
-      for str_len in str_lens:
-        data, scan_ind = TdmsExtractString(tdms_bytestream, start_ind=scan_ind, str_len=str_len)
-        obj_data.append(data)
     else:
-      for _ in range(obj.raw_data_num):
-        data, scan_ind = TdmsExtractAuto(obj.raw_data_type, tdms_bytestream, start_ind=scan_ind, endianness=endianness)
-        obj_data.append(data)
+      for obj in raw_objs:
+        raw_size = TdmsRawDataSize(obj.raw_data_type, obj.raw_data_dim, obj.raw_data_num, obj.raw_data_size)
+        value_size = TdmsDataTypeSize(obj.raw_data_type)
+        layout.blocks[obj.clean_path] = TdmsDataBlock(raw_ind, obj.raw_data_type, obj.raw_data_num, raw_size, settings.endianness, stride=value_size)
+        raw_ind += raw_size
+      layout.chunk_size = raw_ind
 
-    return obj_data, scan_ind
+    return layout
 
 
-  def LoadSegment(self, tdms_bytestream, start_ind):
+  def ValidateSegment(self, lead_in, valid_tag):
+    return TdmsValidateSegment(lead_in, valid_tag=valid_tag)
+
+
+  def ScanSegment(self, tdms_bytestream, start_ind, data_start=None, tdms_tag='TDSm'):
     seg = TdmsSegment()
-    seg.start = start_ind
-    tdms_status, seg.settings, seg.version, seg.len, seg.raw_start = TdmsValidateSegment(tdms_bytestream[start_ind:])
+    seg.meta_start = start_ind
+    seg.start = start_ind if data_start is None else data_start
+    tdms_status, seg.settings, seg.version, seg.len, seg.raw_start = self.ValidateSegment(tdms_bytestream[start_ind:start_ind+28], tdms_tag)
+    seg.meta_end = seg.meta_start + seg.raw_start
     seg.raw_start += seg.start
 
     if not tdms_status:
       raise ValueError("TDMS segment not found at given index")
+    if seg.meta_end > len(tdms_bytestream):
+      raise ValueError("TDMS segment metadata is truncated")
     seg.end = seg.start + seg.len
+    if data_start is None and seg.end > len(tdms_bytestream):  # LabVIEW leaves the length at 0xFFFFFFFFFFFFFFFF when a write is cut short
+      seg.end = len(tdms_bytestream)
 
     if seg.settings.meta_in_seg:
-      scan_ind = seg.start + 28   # header is 28 bytes long
+      scan_ind = seg.meta_start + 28   # header is 28 bytes long
       seg.num_objs, scan_ind = TdmsExtractU32(tdms_bytestream, start_ind=scan_ind, endianness=seg.settings.endianness)
 
       for i in range(seg.num_objs):
         obj, scan_ind = self.LoadObject(tdms_bytestream, scan_ind, endianness=seg.settings.endianness)
         seg.objs[obj.clean_path] = obj
 
-      scan_ind = seg.raw_start
-      for obj_clean_path in seg.objs:
-        obj = seg.objs[obj_clean_path]
-        obj_data, scan_ind = self.LoadObjectRawData(tdms_bytestream, start_ind=scan_ind, obj=obj, endianness=seg.settings.endianness)
-        
-        seg.data[obj_clean_path] = obj_data
+      # without a new object list the segment extends and updates the previous one
+      if seg.settings.new_obj_in_seg or self.layout is None:
+        layout_objs = dict(seg.objs)
+      else:
+        layout_objs = dict(self.layout.objs)
+        layout_objs.update(seg.objs)
+      self.layout = self.BuildSegmentLayout(layout_objs, seg.settings)
 
+    elif self.layout is not None and (self.layout.interleaved != seg.settings.data_interleaved or self.layout.endianness != seg.settings.endianness):
+      self.layout = self.BuildSegmentLayout(self.layout.objs, seg.settings)
+
+    if not seg.settings.raw_data_in_seg or self.layout is None or self.layout.chunk_size == 0:
       return seg
 
+    # raw data holds one or more chunks that all repeat the same layout
+    num_chunks = (seg.end - seg.raw_start) // self.layout.chunk_size
+    for obj_clean_path, layout_block in self.layout.blocks.items():
+      if self.layout.interleaved:  # consecutive chunks of rows form one longer run of rows
+        raw_data_num = layout_block.raw_data_num*num_chunks
+        raw_size = (raw_data_num - 1)*layout_block.stride + TdmsDataTypeSize(layout_block.raw_data_type) if raw_data_num > 0 else 0
+        seg.blocks[obj_clean_path] = [TdmsDataBlock(seg.raw_start + layout_block.raw_start, layout_block.raw_data_type, raw_data_num, raw_size, layout_block.endianness, stride=layout_block.stride)]
+      else:
+        seg.blocks[obj_clean_path] = [TdmsDataBlock(seg.raw_start + chunk_ind*self.layout.chunk_size + layout_block.raw_start, layout_block.raw_data_type,
+                                                    layout_block.raw_data_num, layout_block.raw_size, layout_block.endianness, stride=layout_block.stride)
+                                      for chunk_ind in range(num_chunks)]
+
+    return seg
+
+
+  def LoadInterleavedBlocks(self, tdms_bytestream, seg):
+    numpy_paths = [path for path in seg.blocks if TdmsDataTypeIsNumpy(seg.blocks[path][0].raw_data_type)]
+    if len(numpy_paths) == 0:
+      return {}
+
+    first_block = next(iter(seg.blocks.values()))[0]
+    row_dtype = np.dtype({
+      'names':    ['f' + str(i) for i in range(len(numpy_paths))],
+      'formats':  [TdmsNumpyDtype(seg.blocks[path][0].raw_data_type, seg.settings.endianness) for path in numpy_paths],
+      'offsets':  [seg.blocks[path][0].raw_start - first_block.raw_start for path in numpy_paths],
+      'itemsize': first_block.stride,
+    })
+    rows = np.frombuffer(tdms_bytestream, dtype=row_dtype, count=first_block.raw_data_num, offset=first_block.raw_start)
+
+    seg_data = {}
+    for i, path in enumerate(numpy_paths):
+      column = rows['f' + str(i)]   # strided view into the raw rows
+      if seg.blocks[path][0].raw_data_type == TdmsDataType.tdsTypeBoolean:
+        seg_data[path] = column != 0
+      else:
+        seg_data[path] = column.astype(column.dtype.newbyteorder('='))
+    return seg_data
+
+
+  def LoadSegment(self, tdms_bytestream, start_ind):
+    seg = self.ScanSegment(tdms_bytestream, start_ind)
+    if seg.settings.data_interleaved:
+      seg.data.update(self.LoadInterleavedBlocks(tdms_bytestream, seg))
+
+    for obj_clean_path in seg.blocks:
+      if obj_clean_path not in seg.data:
+        blocks = seg.blocks[obj_clean_path]
+        seg.data[obj_clean_path] = TdmsFileUtil.TdmsConcatData([self.LoadDataBlock(tdms_bytestream, block.raw_start, block) for block in blocks])
+
+    for obj_clean_path in seg.objs:
+      if obj_clean_path not in seg.data:
+        seg.data[obj_clean_path] = []
+
+    return seg
+
 
   def SegmentToTdms(self, seg):
+    if self.root is None:
+      self.root = TdmsRoot()
+
     for obj_clean_path in seg.objs:
       obj = seg.objs[obj_clean_path]
+      if not self.PathSelected(obj.clean_path):
+        continue
+
       if len(obj.clean_path) == 0:  # is root
-        if self.root:
-          raise ValueError("Root object already created")
-        
-        else:
-          self.root = TdmsRoot()
-          TdmsFileUtil.TdmsRootAddProps(self.root, obj.props)
-          TdmsFileUtil.TdmsRootAddData(self.root, seg.data[obj.clean_path])
-      
+        TdmsFileUtil.TdmsRootAddProps(self.root, obj.props)
+
       elif len(obj.clean_path.split('-')) == 1:  # is group
-        group_name = obj.clean_path
-        group = TdmsFileUtil.TdmsRootFetchGroup(self.root, group_name)
+        group = TdmsFileUtil.TdmsRootFetchGroup(self.root, obj.clean_path)
+        group.path = obj.path
         TdmsFileUtil.TdmsGroupAddProps(group, obj.props)
-        TdmsFileUtil.TdmsGroupAddData(group, seg.data[obj.clean_path])
-      
+
       else:  # is channel
         group_name, channel_name = obj.clean_path.split('-')
         group = TdmsFileUtil.TdmsRootFetchGroup(self.root, group_name)
-        TdmsFileUtil.TdmsGroupAddChannelData(group, channel_name, seg.data[obj.clean_path])
         TdmsFileUtil.TdmsGroupAddChannelProps(group, channel_name, obj.props)
     return
 
-  def LoadFile(self, filepath):
-    with open(filepath, 'rb') as file:
-      file_content = file.read()
-    
+
+  def ObjectDataToTdms(self, obj_clean_path, data):
+    if len(obj_clean_path) == 0:  # is root
+      TdmsFileUtil.TdmsRootAddData(self.root, data)
+
+    else:  # is group
+      group = TdmsFileUtil.TdmsRootFetchGroup(self.root, obj_clean_path)
+      TdmsFileUtil.TdmsGroupAddData(group, data)
+    return
+
+  def LoadBytestream(self, tdms_bytestream, workers=1):
+    # pass one: read all metadata so every channel's length is known before any samples are decoded
+    channel_blocks = {}
     scan_ind = 0
-    while scan_ind < len(file_content):
-      seg = self.LoadSegment(file_content, scan_ind)
+    while scan_ind < len(tdms_bytestream):
+      seg = self.ScanSegment(tdms_bytestream, scan_ind)
       scan_ind = seg.end
 
       self.SegmentToTdms(seg)
+      for obj_clean_path in seg.blocks:
+        if not self.PathSelected(obj_clean_path):  # unselected raw data is never touched
+          continue
+        if len(obj_clean_path.split('-')) == 2:
+          channel_blocks.setdefault(obj_clean_path, []).extend(seg.blocks[obj_clean_path])
+        else:  # root and group data is rare enough to decode as it comes
+          data = TdmsFileUtil.TdmsConcatData([self.LoadDataBlock(tdms_bytestream, block.raw_start, block) for block in seg.blocks[obj_clean_path]])
+          self.ObjectDataToTdms(obj_clean_path, data)
+
+    # pass two: decode every block straight into its slice of the preallocated channel arrays
+    channel_data = self.LoadChannelBlocks(tdms_bytestream, channel_blocks, workers=workers)
+    for obj_clean_path, data in channel_data.items():
+      group_name, channel_name = obj_clean_path.split('-')
+      self.root.groups[group_name].channel_data[channel_name] = data
+
+    if self.channels is not None and self.root is not None:
+      TdmsFileUtil.TdmsRootDropEmptyGroups(self.root)
+    return
+
+
+  def LoadChannelBlocks(self, tdms_bytestream, channel_blocks, workers=None):
+    channel_data = {}
+    decode_tasks = []
+
+    # phase one: preallocate every fixed-width channel and assign each block its output slice
+    for channel_key, blocks in channel_blocks.items():
+      if len(blocks) == 0:
+        continue
+      raw_data_type = blocks[0].raw_data_type
+      num_values = sum(block.raw_data_num for block in blocks)
+      if TdmsDataTypeIsNumpy(raw_data_type):
+        out = np.empty(num_values, dtype=TdmsNativeDtype(raw_data_type))
+      elif raw_data_type == TdmsDataType.tdsTypeTimeStamp:
+        out = np.empty(num_values, dtype=TdmsTimeArrayDtype if self.raw_timestamps else 'datetime64[ns]')
+      else:
+        continue
+
+      out_ind = 0
+      for block in blocks:
+        decode_tasks.append((block, out[out_ind:out_ind+block.raw_data_num]))
+        out_ind += block.raw_data_num
+      channel_data[channel_key] = out
+
+    def DecodeTasks(task_batch):
+      for block, out in task_batch:
+        if TdmsDataTypeIsNumpy(block.raw_data_type):
+          TdmsExtractArrayInto(block.raw_data_type, tdms_bytestream, block.raw_start, block.raw_data_num, block.endianness, out, stride=block.stride)
+        else:
+          out[...] = self.LoadDataBlock(tdms_bytestream, block.raw_start, block)
+
+    # phase two: NumPy copies release the GIL, so blocks decode in parallel threads
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+      DecodeTasks(decode_tasks)
+    else:
+      batch_size = max(1, len(decode_tasks) // (workers*4))
+      task_batches = [decode_tasks[i:i+batch_size] for i in range(0, len(decode_tasks), batch_size)]
+      with ThreadPoolExecutor(max_workers=workers) as executor:
+        for _ in executor.map(DecodeTasks, task_batches):
+          pass
+
+    for channel_key, blocks in channel_blocks.items():
+      if channel_key not in channel_data:
+        channel_data[channel_key] = TdmsFileUtil.TdmsConcatData([self.LoadDataBlock(tdms_bytestream, block.raw_start, block) for block in blocks])
+    return channel_data
+
+
+  def LoadFile(self, filepath, use_mmap=True, workers=1):
+    with TdmsOpenBytestream(filepath, use_mmap=use_mmap) as file_content:
+      self.LoadBytestream(file_content, workers=workers)
     return
 
 
+  def SegmentToIndex(self, seg, tdms_file):
+    tdms_file.segments.append((seg.start, seg.raw_start, seg.end))
+    for obj_clean_path in seg.objs:
+      obj = seg.objs[obj_clean_path]
+      if len(obj.clean_path) == 0:  # is root
+        tdms_file.props.update(obj.props)
+        tdms_file.prop_types.update(obj.prop_types)
+
+      elif len(obj.clean_path.split('-')) == 1:  # is group
+        group = TdmsFileUtil.TdmsFileFetchGroup(tdms_file, obj.clean_path)
+        group.path = obj.path
+        TdmsFileUtil.TdmsGroupAddProps(group, obj.props)
+        group.prop_types.update(obj.prop_types)
+
+      else:  # is channel
+        group_name, channel_name = obj.clean_path.split('-')
+        channel = TdmsFileUtil.TdmsFileFetchChannel(tdms_file, group_name, channel_name)
+        channel.path = obj.path
+        channel.props.update(obj.props)
+        channel.prop_types.update(obj.prop_types)
+
+    for obj_clean_path in seg.blocks:
+      if len(obj_clean_path.split('-')) == 2:  # only channels are indexed
+        group_name, channel_name = obj_clean_path.split('-')
+        channel = TdmsFileUtil.TdmsFileFetchChannel(tdms_file, group_name, channel_name)
+        for block in seg.blocks[obj_clean_path]:
+          TdmsFileUtil.TdmsChannelAddBlock(channel, block)
+    return
+
+
+  def ScanBytestream(self, tdms_bytestream, tdms_file, index_file=False):
+    scan_ind = 0
+    data_ind = 0
+    while scan_ind < len(tdms_bytestream):
+      if index_file:
+        seg = self.ScanSegment(tdms_bytestream, scan_ind, data_start=data_ind, tdms_tag='TDSh')
+        scan_ind = seg.meta_end
+      else:
+        seg = self.ScanSegment(tdms_bytestream, scan_ind)
+        scan_ind = seg.end
+      data_ind = seg.end
+
+      self.SegmentToIndex(seg, tdms_file)
+    return data_ind
+
+
+  def ScanFile(self, filepath, tdms_file, use_mmap=True, index_file=False):
+    with TdmsOpenBytestream(filepath, use_mmap=use_mmap) as file_content:
+      data_len = self.ScanBytestream(file_content, tdms_file, index_file=index_file)
+    return data_len
+
+
+
+# =================================================================================================
+# TDMS File Handle Classes
+# =================================================================================================
+
+class TdmsChannel:
+  def __init__(self, tdms_file, group_name, name):
+    self.tdms_file      = tdms_file
+    self.group_name     = group_name
+    self.name           = name
+    self.path           = ""
+    self.props          = {}
+    self.prop_types     = {}
+    self.raw_data_type  = TdmsDataType.tdsTypeVoid
+    self.blocks         = []
+    self.num_values     = 0
+    self.block_ends     = None
+    self.cached_data    = None
+
+  def __len__(self):
+    return self.num_values
+
+  def __getitem__(self, key):
+    if self.cached_data is not None:
+      return self.cached_data[key]
+
+    if isinstance(key, slice):
+      value_range = range(*key.indices(self.num_values))
+      if len(value_range) == 0:
+        return self.tdms_file.ReadChannelRange(self, 0, 0)
+      if value_range.step > 0:
+        return self.tdms_file.ReadChannelRange(self, value_range.start, value_range[-1]+1)[::value_range.step]
+      return self.tdms_file.ReadChannelRange(self, value_range[-1], value_range.start+1)[::value_range.step]
+
+    value_ind = key + self.num_values if key < 0 else key
+    if not 0 <= value_ind < self.num_values:
+      raise IndexError("Channel index out of range")
+    return self.tdms_file.ReadChannelRange(self, value_ind, value_ind+1)[0]
+
+  @property
+  def data(self):
+    if self.cached_data is None:
+      self.cached_data = self.tdms_file.ReadChannel(self)
+    return self.cached_data
+
+  def envelope(self, start=0, stop=None, n_points=1000):
+    return TdmsChannelEnvelope(self, start, stop, n_points)
+
+  def BlockEnds(self):
+    if self.block_ends is None:
+      self.block_ends = np.cumsum([block.raw_data_num for block in self.blocks], dtype=np.int64)
+    return self.block_ends
+
+
+class TdmsLazyChannelData(Mapping):
+  def __init__(self):
+    self.channels = {}
+
+  def __getitem__(self, channel_name):
+    return self.channels[channel_name].data
+
+  def __iter__(self):
+    return iter(self.channels)
+
+  def __len__(self):
+    return len(self.channels)
+
+
+TdmsIndexMaxLag = 2   # seconds the data file may be modified after its index
+
+
+class TdmsFile:
+  def __init__(self, filepath, use_mmap=True, use_index=True, layout_cache=None, raw_timestamps=False, stats=None):
+    self.filepath   = filepath
+    self.groups     = {}
+    self.props      = {}
+    self.prop_types = {}
+    self.segments   = []
+    self.loader     = TdmsLoader(raw_timestamps=raw_timestamps, stats=stats)
+    self.from_index = False
+    self.from_cache = False
+
+    if layout_cache is not None:
+      self.from_cache = layout_cache.Load(self)
+    if not self.from_cache:
+      if use_index:
+        self.from_index = self.ScanIndexFile(use_mmap)
+      if not self.from_index:
+        self.loader.ScanFile(filepath, self, use_mmap=use_mmap)
+      if layout_cache is not None:
+        layout_cache.Store(self)
+    self.file       = open(filepath, 'rb')
+    self.pyramid    = None
+    self.pyramid_checked = False
+
+  def ScanIndexFile(self, use_mmap):
+    index_path = TdmsIndexPath(self.filepath)
+    if not os.path.isfile(index_path):
+      return False
+    # LabVIEW finishes a data segment after its index segment, so a slightly newer data file is still current
+    if os.stat(index_path).st_mtime_ns + TdmsIndexMaxLag*10**9 < os.stat(self.filepath).st_mtime_ns:
+      return False
+
+    try:
+      data_len = self.loader.ScanFile(index_path, self, use_mmap=use_mmap, index_file=True)
+    except ValueError:
+      data_len = None
+
+    # index is stale if its segments do not add up to the data file or its outer lead-ins differ
+    if data_len == os.path.getsize(self.filepath) and self.IndexMatchesData(index_path):
+      return True
+
+    self.groups     = {}
+    self.props      = {}
+    self.prop_types = {}
+    self.segments   = []
+    self.loader   = TdmsLoader(raw_timestamps=self.loader.raw_timestamps, stats=self.loader.stats)
+    return False
+
+  def IndexMatchesData(self, index_path):
+    # only the first and last lead-ins are compared, reading every segment's metadata would defeat the index
+    if len(self.segments) == 0:
+      return True
+    last_index_ind = sum(raw_start - seg_start for seg_start, raw_start, _ in self.segments[:-1])
+
+    with open(index_path, 'rb') as index_file, open(self.filepath, 'rb') as data_file:
+      for index_ind, (seg_start, _, _) in ((0, self.segments[0]), (last_index_ind, self.segments[-1])):
+        index_file.seek(index_ind)
+        data_file.seek(seg_start)
+        data_lead_in = data_file.read(28)
+        if data_lead_in[:4] != b'TDSm' or data_lead_in[4:] != index_file.read(28)[4:]:
+          return False
+    return True
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    self.file.close()
+
+  def channel(self, group_name, channel_name):
+    return self.groups[group_name].channel_data.channels[channel_name]
+
+  def FetchPyramid(self):
+    if not self.pyramid_checked:
+      self.pyramid = TdmsPyramid.Load(self.filepath)
+      self.pyramid_checked = True
+    return self.pyramid
+
+  def BuildPyramid(self, bin_size=None, factor=None, chunk_size=1000000):
+    TdmsWritePyramid(self, bin_size=bin_size, factor=factor, chunk_size=chunk_size)
+    self.pyramid_checked = False
+
+  def ReadDataBlock(self, block):
+    self.file.seek(block.raw_start)
+    raw_bytes = self.file.read(block.raw_size)
+    return self.loader.LoadDataBlock(raw_bytes, 0, block)
+
+  def ReadDataBlockRange(self, block, start, count):
+    if start == 0 and count == block.raw_data_num:
+      return self.ReadDataBlock(block)
+
+    if block.raw_data_type == TdmsDataType.tdsTypeString:
+      return self.ReadStringBlockRange(block, start, count)
+
+    sub_block = TdmsFileUtil.TdmsBlockSlice(block, start, count)
+    if sub_block is None:  # variable length values cannot be addressed by index
+      return self.ReadDataBlock(block)[start:start+count]
+    return self.ReadDataBlock(sub_block)
+
+  def ReadStringBlockRange(self, block, start, count):
+    # the end offset of the preceding string is the start of the first requested one
+    offset_ind = max(start - 1, 0)
+    self.file.seek(block.raw_start + 4*offset_ind)
+    end_offsets, _ = TdmsExtractArray(TdmsDataType.tdsTypeU32, self.file.read(4*(start + count - offset_ind)), 0, start + count - offset_ind, block.endianness)
+
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    offsets[1:] = end_offsets[start - offset_ind:]
+    if start > 0:
+      offsets[0] = end_offsets[0]
+
+    self.file.seek(block.raw_start + 4*block.raw_data_num + int(offsets[0]))
+    buffer = self.file.read(int(offsets[-1] - offsets[0]))
+    return TdmsStringArray(buffer, offsets - offsets[0])
+
+  def ReadChannel(self, channel):
+    return TdmsFileUtil.TdmsConcatData([self.ReadDataBlock(block) for block in channel.blocks])
+
+  def ReadAllChannels(self, workers=None, groups=None, channels=None):
+    read_channels = [channel for group in self.groups.values() for channel in group.channel_data.channels.values()
+                     if channel.cached_data is None and TdmsObjectSelected(channel.group_name, channel.name, groups=groups, channels=channels)]
+    with TdmsOpenBytestream(self.filepath) as tdms_bytestream:
+      channel_data = self.loader.LoadChannelBlocks(tdms_bytestream, {channel: channel.blocks for channel in read_channels}, workers=workers)
+
+    for channel in read_channels:
+      channel.cached_data = channel_data[channel]
+
+  def ReadChannelRange(self, channel, start, stop):
+    block_ends = channel.BlockEnds()
+    block_ind = int(np.searchsorted(block_ends, start, side='right'))
+    data_parts = []
+
+    value_ind = start
+    while value_ind < stop:
+      block = channel.blocks[block_ind]
+      block_end = int(block_ends[block_ind])
+      count = min(stop, block_end) - value_ind
+      data_parts.append(self.ReadDataBlockRange(block, value_ind - (block_end - block.raw_data_num), count))
+      value_ind += count
+      block_ind += 1
+
+    if len(data_parts) == 0 and TdmsDataTypeIsNumpy(channel.raw_data_type):
+      return np.empty(0, dtype=TdmsNativeDtype(channel.raw_data_type))
+    if len(data_parts) == 0 and channel.raw_data_type == TdmsDataType.tdsTypeString:
+      return TdmsStringArray()
+    return TdmsFileUtil.TdmsConcatData(data_parts)
+
+  def iter_channel(self, group_name, channel_name, chunk_size=1000000):
+    channel = self.channel(group_name, channel_name)
+    data_parts = []
+    part_len = 0
+
+    for block in channel.blocks:
+      block_ind = 0
+      while block_ind < block.raw_data_num:
+        count = min(chunk_size - part_len, block.raw_data_num - block_ind)
+        data_parts.append(self.ReadDataBlockRange(block, block_ind, count))
+        block_ind += count
+        part_len += count
+
+        if part_len == chunk_size:
+          yield TdmsFileUtil.TdmsConcatData(data_parts)
+          data_parts = []
+          part_len = 0
+
+    if part_len > 0:
+      yield TdmsFileUtil.TdmsConcatData(data_parts)
+
+
+
+# =================================================================================================
+# TDMS Live Tail Reader
+# =================================================================================================
+
+class TdmsTailReader:
+  def __init__(self, filepath, raw_timestamps=False):
+    self.filepath = filepath
+    self.loader   = TdmsLoader(raw_timestamps=raw_timestamps)
+    self.root     = TdmsRoot()
+    self.scan_ind = 0
+    self.loader.root = self.root
+
+  def ReadCompleteSegment(self, file, file_size):
+    if self.scan_ind + 28 > file_size:
+      return None
+
+    file.seek(self.scan_ind)
+    lead_in = file.read(28)
+    tdms_status, _, _, seg_len, _ = TdmsValidateSegment(lead_in)
+    if not tdms_status:
+      raise ValueError("TDMS segment not found at given index")
+
+    # segments still being written report a length past the end of the file
+    if self.scan_ind + seg_len > file_size:
+      return None
+    return lead_in + file.read(seg_len - 28)
+
+  def poll(self):
+    new_data = {}
+    with open(self.filepath, 'rb') as file:
+      file_size = os.fstat(file.fileno()).st_size
+      while True:
+        seg_bytes = self.ReadCompleteSegment(file, file_size)
+        if seg_bytes is None:
+          break
+
+        seg = self.loader.LoadSegment(seg_bytes, 0)
+        self.scan_ind += seg.len
+        self.loader.SegmentToTdms(seg)
+
+        for obj_clean_path in seg.blocks:
+          if len(obj_clean_path.split('-')) != 2:  # only channels carry samples
+            continue
+          group_name, channel_name = obj_clean_path.split('-')
+          new_data.setdefault(group_name, {}).setdefault(channel_name, []).append(seg.data[obj_clean_path])
+
+    for group_data in new_data.values():
+      for channel_name in group_data:
+        group_data[channel_name] = TdmsFileUtil.TdmsConcatData(group_data[channel_name])
+    return new_data
+
+
+
+# =================================================================================================
+# TDMS Layout Cache
+# =================================================================================================
+
+TdmsLayoutCacheVersion  = 5
+TdmsLayoutCacheMaxBytes = 256 * 1024**2
+TdmsLayoutCacheEpoch    = datetime(1904, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
+
+
+class TdmsLayoutCache:
+  def __init__(self, cache_dir, max_bytes=TdmsLayoutCacheMaxBytes):
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    os.makedirs(cache_dir, exist_ok=True)
+
+
+  @staticmethod
+  def CacheKey(filepath):
+    file_stat = os.stat(filepath)
+    return (os.path.abspath(filepath), file_stat.st_size, file_stat.st_mtime_ns)
+
+
+  def CachePath(self, cache_key):
+    key_hash = hashlib.sha1(repr(cache_key).encode('utf-8')).hexdigest()
+    return os.path.join(self.cache_dir, key_hash + '.tdms_layout')
+
+
+  # props are stored as [name, TDMS data type, value], with timestamps as microseconds from the TDMS epoch
+  @staticmethod
+  def PropsToJson(props, prop_types):
+    prop_items = []
+    for prop_name, prop_value in props.items():
+      prop_datatype = prop_types[prop_name].value if prop_name in prop_types else None
+      if isinstance(prop_value, datetime):
+        prop_value = (prop_value - TdmsLayoutCacheEpoch) // timedelta(microseconds=1)
+      prop_items.append([prop_name, prop_datatype, prop_value])
+    return prop_items
+
+
+  @staticmethod
+  def PropsFromJson(prop_items, prop_types):
+    props = {}
+    for prop_name, prop_datatype, prop_value in prop_items:
+      if prop_datatype is not None:
+        prop_types[prop_name] = TdmsDataType(prop_datatype)
+      if prop_datatype == TdmsDataType.tdsTypeTimeStamp.value:
+        prop_value = TdmsLayoutCacheEpoch + timedelta(microseconds=prop_value)
+      props[prop_name] = prop_value
+    return props
+
+
+  # blocks are stored as rows of one integer array, which is far smaller and faster to load than objects
+  @staticmethod
+  def BlockToRow(block):
+    return (block.raw_start, block.raw_data_type.value, block.raw_data_num, block.raw_size, block.endianness == 'big', block.stride)
+
+
+  @staticmethod
+  def LayoutFromFile(tdms_file):
+    groups = []
+    block_rows = []
+    for group in tdms_file.groups.values():
+      channels = []
+      for channel in group.channel_data.channels.values():
+        block_rows += [TdmsLayoutCache.BlockToRow(block) for block in channel.blocks]
+        channel_props = TdmsLayoutCache.PropsToJson(channel.props, channel.prop_types)
+        channels.append([channel.name, channel.path, channel_props, channel.raw_data_type.value, len(channel.blocks)])
+      groups.append([group.name, group.path, TdmsLayoutCache.PropsToJson(group.props, group.prop_types), channels])
+
+    obj_templates = {clean_path: [template.obj_path, template.raw_data_ind, template.raw_data_type.value, template.raw_data_dim,
+                                  template.raw_data_num, template.raw_data_size]
+                     for clean_path, template in tdms_file.loader.obj_templates.items()}
+    header = {
+      'version':        TdmsLayoutCacheVersion,
+      'props':          TdmsLayoutCache.PropsToJson(tdms_file.props, tdms_file.prop_types),
+      'obj_templates':  obj_templates,
+      'groups':         groups,
+    }
+    segments = np.array(tdms_file.segments, dtype=np.int64).reshape(-1, 3)
+    blocks = np.array(block_rows, dtype=np.int64).reshape(-1, 6)
+    return header, segments, blocks
+
+
+  @staticmethod
+  def LayoutToFile(header, segments, blocks, tdms_file):
+    data_types = {tdms_datatype.value: tdms_datatype for tdms_datatype in TdmsDataType}
+    tdms_file.props.update(TdmsLayoutCache.PropsFromJson(header['props'], tdms_file.prop_types))
+    tdms_file.segments = [tuple(segment) for segment in segments.tolist()]
+    for clean_path, (obj_path, raw_data_ind, raw_data_type, raw_data_dim, raw_data_num, raw_data_size) in header['obj_templates'].items():
+      tdms_file.loader.obj_templates[clean_path] = TdmsObjTemplate(obj_path, clean_path, raw_data_ind, data_types[raw_data_type],
+                                                                   raw_data_dim, raw_data_num, raw_data_size)
+
+    block_rows = blocks.tolist()
+    block_ind = 0
+    for group_name, group_path, group_props, channels in header['groups']:
+      group = TdmsFileUtil.TdmsFileFetchGroup(tdms_file, group_name)
+      group.path = group_path
+      TdmsFileUtil.TdmsGroupAddProps(group, TdmsLayoutCache.PropsFromJson(group_props, group.prop_types))
+      for channel_name, channel_path, channel_props, raw_data_type, num_blocks in channels:
+        channel = TdmsFileUtil.TdmsFileFetchChannel(tdms_file, group_name, channel_name)
+        channel.path = channel_path
+        channel.props.update(TdmsLayoutCache.PropsFromJson(channel_props, channel.prop_types))
+        channel.raw_data_type = data_types[raw_data_type]
+        for raw_start, block_type, raw_data_num, raw_size, big_endian, stride in block_rows[block_ind:block_ind+num_blocks]:
+          block = TdmsDataBlock(raw_start, data_types[block_type], raw_data_num, raw_size, 'big' if big_endian else 'little', stride=stride)
+          TdmsFileUtil.TdmsChannelAddBlock(channel, block)
+        block_ind += num_blocks
+
+
+  def Load(self, tdms_file):
+    cache_key = TdmsLayoutCache.CacheKey(tdms_file.filepath)
+    cache_path = self.CachePath(cache_key)
+    if not os.path.isfile(cache_path):
+      return False
+
+    # entries hold only JSON and plain integer arrays, so a shared cache directory cannot inject code
+    try:
+      with np.load(cache_path, allow_pickle=False) as cache_arrays:
+        header    = json.loads(cache_arrays['header'].tobytes().decode('utf-8'))
+        segments  = cache_arrays['segments']
+        blocks    = cache_arrays['blocks']
+    except Exception:  # unreadable entries are treated as a miss and rewritten
+      return False
+
+    if header.get('version') != TdmsLayoutCacheVersion or header.get('key') != list(cache_key):
+      return False
+
+    os.utime(cache_path)  # mark as most recently used
+    TdmsLayoutCache.LayoutToFile(header, segments, blocks, tdms_file)
+    return True
+
+
+  def Store(self, tdms_file):
+    cache_key = TdmsLayoutCache.CacheKey(tdms_file.filepath)
+    header, segments, blocks = TdmsLayoutCache.LayoutFromFile(tdms_file)
+    header['key'] = cache_key
+    header_bytes = np.frombuffer(json.dumps(header).encode('utf-8'), dtype=np.uint8)
+
+    tmp_fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+    with os.fdopen(tmp_fd, 'wb') as tmp_file:
+      np.savez_compressed(tmp_file, header=header_bytes, segments=segments, blocks=blocks)
+    os.replace(tmp_path, self.CachePath(cache_key))
+
+    self.Evict()
+
+
+  def Evict(self):
+    entries = []
+    for entry in os.scandir(self.cache_dir):
+      if entry.name.endswith('.tdms_layout'):
+        entry_stat = entry.stat()
+        entries.append((entry_stat.st_mtime, entry_stat.st_size, entry.path))
+
+    total_bytes = sum(entry[1] for entry in entries)
+    for _, entry_size, entry_path in sorted(entries):
+      if total_bytes <= self.max_bytes:
+        break
+      try:
+        os.remove(entry_path)
+      except FileNotFoundError:  # already evicted by another process
+        pass
+      total_bytes -= entry_size
+
+
+
+# =================================================================================================
+# TDMS Decimation Pyramid
+# =================================================================================================
+
+TdmsPyramidVersion  = 1
+TdmsPyramidMagic    = b'TDMSPYR1'
+TdmsPyramidBinSize  = 1024
+TdmsPyramidFactor   = 16
+
+
+class TdmsPyramidLevel:
+  def __init__(self, bin_size, bins):
+    self.bin_size = bin_size
+    self.bins     = bins   # one (min, max, sum) row per bin
+
+
+class TdmsEnvelope:
+  def __init__(self, index, min, max, mean):
+    self.index  = index   # first sample of every point
+    self.min    = min
+    self.max    = max
+    self.mean   = mean
+
+  def __len__(self):
+    return len(self.index)
+
+
+class TdmsPyramidBuilder:
+  def __init__(self, bin_size):
+    self.bin_size = bin_size
+    self.carry    = np.empty(0, dtype=np.float64)
+    self.parts    = []
+
+  def Add(self, data):
+    values = np.concatenate([self.carry, np.asarray(data, dtype=np.float64)])
+    num_full = len(values) // self.bin_size * self.bin_size
+    full_bins = values[:num_full].reshape(-1, self.bin_size)
+    self.parts.append(np.stack([full_bins.min(axis=1), full_bins.max(axis=1), full_bins.sum(axis=1)], axis=1))
+    self.carry = values[num_full:]
+
+  def Finish(self):
+    if len(self.carry) > 0:
+      self.parts.append(np.array([[self.carry.min(), self.carry.max(), self.carry.sum()]]))
+      self.carry = np.empty(0, dtype=np.float64)
+    if len(self.parts) == 0:
+      return np.empty((0, 3), dtype=np.float64)
+    return np.concatenate(self.parts)
+
+
+class TdmsPyramid:
+  def __init__(self, filepath, header, data):
+    self.filepath = filepath
+    self.header   = header
+    self.data     = data
+
+  @staticmethod
+  def SourceKey(filepath):
+    file_stat = os.stat(filepath)
+    return [file_stat.st_size, file_stat.st_mtime_ns]
+
+  @staticmethod
+  def Load(filepath):
+    pyramid_path = TdmsPyramidPath(filepath)
+    if not os.path.isfile(pyramid_path):
+      return None
+
+    with open(pyramid_path, 'rb') as file:
+      if file.read(len(TdmsPyramidMagic)) != TdmsPyramidMagic:
+        return None
+      header_len = struct.unpack('<Q', file.read(8))[0]
+      header = json.loads(file.read(header_len).decode('utf-8'))
+
+    # a pyramid built from another version of the file is ignored
+    if header['version'] != TdmsPyramidVersion or header['source'] != TdmsPyramid.SourceKey(filepath):
+      return None
+    if header['data_len'] == 0:
+      return TdmsPyramid(filepath, header, np.empty(0, dtype='<f8'))
+    data_start = len(TdmsPyramidMagic) + 8 + header_len
+    data = np.memmap(pyramid_path, dtype='<f8', mode='r', offset=data_start, shape=(header['data_len'],))
+    return TdmsPyramid(filepath, header, data)
+
+  def Levels(self, group_name, channel_name):
+    channel_key = group_name + '/' + channel_name
+    if channel_key not in self.header['channels']:
+      return []
+    return [TdmsPyramidLevel(bin_size, self.data[offset:offset+3*num_bins].reshape(num_bins, 3))
+            for bin_size, offset, num_bins in self.header['channels'][channel_key]]
+
+
+def TdmsPyramidPath(filepath):
+  return str(filepath) + '_pyramid'
+
+
+def TdmsReducePyramidLevel(bins, factor):
+  num_bins = -(-len(bins) // factor)
+  padded = np.empty((num_bins*factor, 3), dtype=np.float64)
+  padded[:len(bins)] = bins
+  padded[len(bins):] = [np.inf, -np.inf, 0.0]
+  grouped = padded.reshape(num_bins, factor, 3)
+  return np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1), grouped[:, :, 2].sum(axis=1)], axis=1)
+
+
+def TdmsWritePyramid(tdms_file, bin_size=None, factor=None, chunk_size=1000000):
+  bin_size = bin_size or TdmsPyramidBinSize
+  factor = factor or TdmsPyramidFactor
+  channels = [channel for group in tdms_file.groups.values() for channel in group.channel_data.channels.values()
+              if TdmsDataTypeIsNumpy(channel.raw_data_type) and channel.num_values > 0]
+
+  # one pass over the raw data in file order, feeding every block to its channel's builder
+  builders = {channel: TdmsPyramidBuilder(bin_size) for channel in channels}
+  file_blocks = sorted(((block.raw_start, channel_ind, block) for channel_ind, channel in enumerate(channels) for block in channel.blocks), key=lambda item: item[:2])
+  for _, channel_ind, block in file_blocks:
+    for block_ind in range(0, block.raw_data_num, chunk_size):
+      builders[channels[channel_ind]].Add(tdms_file.ReadDataBlockRange(block, block_ind, min(chunk_size, block.raw_data_num - block_ind)))
+
+  header = {'version': TdmsPyramidVersion, 'source': TdmsPyramid.SourceKey(tdms_file.filepath), 'channels': {}}
+  level_arrays = []
+  data_len = 0
+  for channel in channels:
+    levels = []
+    bins = builders[channel].Finish()
+    level_bin_size = bin_size
+    while True:
+      levels.append([level_bin_size, data_len, len(bins)])
+      level_arrays.append(bins)
+      data_len += 3*len(bins)
+      if len(bins) <= factor:
+        break
+      bins = TdmsReducePyramidLevel(bins, factor)
+      level_bin_size *= factor
+    header['channels'][channel.group_name + '/' + channel.name] = levels
+
+  header['data_len'] = data_len
+  header_bytes = json.dumps(header).encode('utf-8')
+  header_bytes += b' '*(-len(header_bytes) % 8)   # keeps the level data 8-byte aligned
+
+  pyramid_path = TdmsPyramidPath(tdms_file.filepath)
+  with open(pyramid_path + '.tmp', 'wb') as file:
+    file.write(TdmsPyramidMagic + struct.pack('<Q', len(header_bytes)) + header_bytes)
+    for bins in level_arrays:
+      file.write(np.ascontiguousarray(bins, dtype='<f8'))
+  os.replace(pyramid_path + '.tmp', pyramid_path)
+  return pyramid_path
+
+
+def TdmsBuildPyramid(filepath, bin_size=None, factor=None, chunk_size=1000000):
+  with TdmsFile(filepath) as tdms_file:
+    return TdmsWritePyramid(tdms_file, bin_size=bin_size, factor=factor, chunk_size=chunk_size)
+
+
+def TdmsRawEnvelopeBins(channel, start, stop, bin_size):
+  builder = TdmsPyramidBuilder(bin_size)
+  for chunk_start in range(start, stop, 1000000):
+    builder.Add(channel.tdms_file.ReadChannelRange(channel, chunk_start, min(chunk_start + 1000000, stop)))
+  bins = builder.Finish()
+  bin_starts = start + np.arange(len(bins), dtype=np.int64)*bin_size
+  return bin_starts, np.minimum(bin_starts + bin_size, stop) - bin_starts, bins
+
+
+def TdmsChannelEnvelope(channel, start, stop, n_points):
+  stop = channel.num_values if stop is None else min(stop, channel.num_values)
+  start = max(start, 0)
+  if stop <= start or n_points <= 0:
+    empty = np.empty(0, dtype=np.float64)
+    return TdmsEnvelope(np.empty(0, dtype=np.int64), empty, empty, empty)
+
+  # the coarsest level that still has a bin for every point answers the query
+  samples_per_point = (stop - start) / n_points
+  pyramid = channel.tdms_file.FetchPyramid()
+  levels = pyramid.Levels(channel.group_name, channel.name) if pyramid is not None else []
+  levels = [level for level in levels if level.bin_size <= samples_per_point]
+
+  if len(levels) > 0:
+    # whole bins come from the level, the partial bins at either edge from at most two bins of raw samples
+    bin_size = levels[-1].bin_size
+    first_bin, last_bin = -(-start // bin_size), stop // bin_size
+    head_stop, tail_start = min(first_bin*bin_size, stop), max(last_bin*bin_size, first_bin*bin_size)
+    parts = [TdmsRawEnvelopeBins(channel, start, head_stop, head_stop - start)] if head_stop > start else []
+    if last_bin > first_bin:
+      bin_starts = np.arange(first_bin, last_bin, dtype=np.int64)*bin_size
+      parts.append((bin_starts, np.full(len(bin_starts), bin_size), np.asarray(levels[-1].bins[first_bin:last_bin])))
+    if stop > tail_start:
+      parts.append(TdmsRawEnvelopeBins(channel, tail_start, stop, stop - tail_start))
+    bin_starts, bin_counts, bins = (np.concatenate(part_arrays) for part_arrays in zip(*parts))
+  else:  # too few samples per point, or no pyramid: summarise the raw samples in the range
+    bin_starts, bin_counts, bins = TdmsRawEnvelopeBins(channel, start, stop, max(1, int(samples_per_point)))
+
+  point_edges = start + (stop - start)*np.arange(n_points, dtype=np.int64) // n_points
+  point_starts = np.unique(np.searchsorted(bin_starts, point_edges))
+  point_starts = point_starts[point_starts < len(bin_starts)]
+  return TdmsEnvelope(bin_starts[point_starts],
+                      np.minimum.reduceat(bins[:, 0], point_starts),
+                      np.maximum.reduceat(bins[:, 1], point_starts),
+                      np.add.reduceat(bins[:, 2], point_starts) / np.add.reduceat(bin_counts, point_starts))
+
+
+
+# =================================================================================================
+# TDMS Writer
+# =================================================================================================
+
+TdmsWriterSegmentSize       = 16 * 1024**2
+TdmsWriterVersion           = 4713
+TdmsStringSegmentMaxBytes   = 2**32 - 1
+
+
+class TdmsWriterChannel:
+  def __init__(self, path, group_path, raw_data_type):
+    self.path           = path
+    self.group_path     = group_path
+    self.raw_data_type  = raw_data_type
+    self.data_parts     = []
+    self.num_values     = 0
+    self.raw_size       = 0
+    self.written_index  = None   # (num values, raw size) of the last segment that declared this channel
+
+
+class TdmsWriter:
+  def __init__(self, filepath, segment_size=TdmsWriterSegmentSize, write_index=False):
+    self.filepath       = filepath
+    self.segment_size   = segment_size
+    self.file           = open(filepath, 'wb')
+    self.index_file     = open(TdmsIndexPath(filepath), 'wb') if write_index else None
+    if not write_index and os.path.isfile(TdmsIndexPath(filepath)):  # an old index would describe the old file
+      os.remove(TdmsIndexPath(filepath))
+    self.channels       = {}
+    self.pending_props  = {}
+    self.known_paths    = set()
+    self.layout         = None
+    self.buffered_size  = 0
+    self.first_path     = None
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    if self.file.closed:
+      return
+    self.flush()
+    self.file.close()
+    if self.index_file is not None:
+      self.index_file.close()
+
+  def write_props(self, props, group_name=None, channel_name=None):
+    obj_path = TdmsObjectPath(group_name, channel_name)
+    self.pending_props.setdefault(obj_path, {}).update(props)
+
+  def write_channel(self, group_name, channel_name, data):
+    obj_path = TdmsObjectPath(group_name, channel_name)
+    raw_data_type, raw_data, num_values = TdmsPackRawData(data)
+
+    # full buffers are written when the first buffered channel comes round again, so regular write patterns
+    # repeat the same layout and get raw data only segments
+    if self.buffered_size >= self.segment_size and (obj_path == self.first_path or self.buffered_size >= 2*self.segment_size):
+      self.flush()
+    if self.buffered_size == 0:
+      self.first_path = obj_path
+
+    if obj_path not in self.channels:
+      self.channels[obj_path] = TdmsWriterChannel(obj_path, TdmsObjectPath(group_name), raw_data_type)
+    channel = self.channels[obj_path]
+    if channel.raw_data_type != raw_data_type:
+      raise ValueError("Channel " + obj_path + " was written as " + channel.raw_data_type.name + ", not " + raw_data_type.name)
+
+    channel.data_parts.append(raw_data)
+    channel.num_values += num_values
+    channel.raw_size += TdmsRawDataBytes(raw_data)
+    self.buffered_size += TdmsRawDataBytes(raw_data)
+
+  def flush(self):
+    seg_channels = [channel for channel in self.channels.values() if channel.num_values > 0]
+    if len(seg_channels) == 0 and len(self.pending_props) == 0:
+      return
+
+    # segments that repeat the previous layout carry raw data only
+    layout = [(channel.path, channel.raw_data_type, channel.num_values, channel.raw_size) for channel in seg_channels]
+    mask_settings = TdmsMaskSettings()
+    mask_settings.raw_data_in_seg = len(seg_channels) > 0
+    if layout != self.layout or len(self.pending_props) > 0:
+      mask_settings.meta_in_seg     = True
+      mask_settings.new_obj_in_seg  = True
+      meta = self.PackMetadata(seg_channels)
+    else:
+      meta = b''
+
+    raw_size = sum(channel.raw_size for channel in seg_channels)
+    lead_in = struct.pack('<IIQQ', TdmsCreateMask(mask_settings), TdmsWriterVersion, len(meta) + raw_size, len(meta))
+    self.file.write(b'TDSm' + lead_in)
+    self.file.write(meta)
+    for channel in seg_channels:
+      if channel.raw_data_type == TdmsDataType.tdsTypeString:  # all writes since the last flush form one block
+        self.file.write(TdmsPackStringArray(TdmsStringArray.Concatenate(channel.data_parts)))
+        continue
+      for raw_data in channel.data_parts:
+        self.file.write(raw_data)
+    if self.index_file is not None:
+      self.index_file.write(b'TDSh' + lead_in)
+      self.index_file.write(meta)
+
+    for channel in seg_channels:
+      channel.written_index = (channel.num_values, channel.raw_size)
+      channel.data_parts = []
+      channel.num_values = 0
+      channel.raw_size = 0
+    self.layout = layout
+    self.pending_props = {}
+    self.buffered_size = 0
+
+  def PackMetadata(self, seg_channels):
+    seg_paths = set(channel.path for channel in seg_channels)
+    obj_paths = [obj_path for obj_path in self.pending_props if obj_path not in seg_paths]
+    for channel in seg_channels:   # every group is declared before its first channel
+      if channel.group_path not in self.known_paths and channel.group_path not in obj_paths:
+        obj_paths.append(channel.group_path)
+    if '/' not in self.known_paths and '/' not in obj_paths:
+      obj_paths.insert(0, '/')
+
+    obj_parts = []
+    for obj_path in obj_paths:
+      obj_parts.append(TdmsPackString(obj_path) + struct.pack('<I', 0xFFFFFFFF) + TdmsPackProps(self.pending_props.get(obj_path, {})))
+      self.known_paths.add(obj_path)
+
+    for channel in seg_channels:
+      if channel.written_index == (channel.num_values, channel.raw_size):
+        raw_index = struct.pack('<I', 0)   # same as in the previous segment
+      elif TdsmDataLenIsVariable(channel.raw_data_type):
+        raw_index = struct.pack('<IIIQQ', 28, channel.raw_data_type.value, 1, channel.num_values, channel.raw_size)
+      else:
+        raw_index = struct.pack('<IIIQ', 20, channel.raw_data_type.value, 1, channel.num_values)
+      obj_parts.append(TdmsPackString(channel.path) + raw_index + TdmsPackProps(self.pending_props.get(channel.path, {})))
+      self.known_paths.add(channel.path)
+
+    return struct.pack('<I', len(obj_parts)) + b''.join(obj_parts)
+
+
+def TdmsObjectPath(group_name=None, channel_name=None):
+  if group_name is None:
+    return '/'
+  obj_path = "/'" + group_name.replace("'", "''") + "'"
+  if channel_name is not None:
+    obj_path += "/'" + channel_name.replace("'", "''") + "'"
+  return obj_path
+
+
+def TdmsPackString(value):
+  value_bytes = value.encode('utf-8')
+  return struct.pack('<I', len(value_bytes)) + value_bytes
+
+
+def TdmsPackTimeArray(datetime64_array):
+  epoch_ns = np.asarray(datetime64_array).astype('datetime64[ns]').view(np.int64)
+  seconds, remainder_ns = np.divmod(epoch_ns, 1000000000)
+
+  # rounding the fraction up makes it read back as the exact nanosecond
+  time_array = np.empty(len(epoch_ns), dtype=[('fraction', '<u8'), ('seconds', '<i8')])
+  time_array['seconds']  = seconds + TdmsEpochOffset
+  time_array['fraction'] = ((remainder_ns*(1 << 32) + 999999999) // 1000000000).astype(np.uint64) << np.uint64(32)
+  return time_array
+
+
+def TdmsPackValue(value):
+  if isinstance(value, str):
+    return TdmsDataType.tdsTypeString, TdmsPackString(value)
+  if isinstance(value, (bool, np.bool_)):
+    return TdmsDataType.tdsTypeBoolean, struct.pack('<B', bool(value))
+  if isinstance(value, (int, np.integer)):
+    if -2**31 <= value < 2**31:
+      return TdmsDataType.tdsTypeI32, struct.pack('<i', value)
+    return TdmsDataType.tdsTypeI64, struct.pack('<q', value)
+  if isinstance(value, (float, np.floating)):
+    return TdmsDataType.tdsTypeDoubleFloat, struct.pack('<d', value)
+  if isinstance(value, datetime):
+    if value.tzinfo is not None:
+      value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    value = np.datetime64(value, 'ns')
+  if isinstance(value, np.datetime64):
+    return TdmsDataType.tdsTypeTimeStamp, TdmsPackTimeArray([value]).tobytes()
+  raise TypeError("Cannot write property value of type " + type(value).__name__)
+
+
+def TdmsPackTypedValue(prop_datatype, value):
+  if TdmsDataTypeIsNumpy(prop_datatype):  # keeps the original width and signedness, e.g. U64 values past the I64 range
+    return prop_datatype, np.array(value, dtype=TdmsNumpyDtype(prop_datatype, 'little')).tobytes()
+  return TdmsPackValue(value)
+
+
+def TdmsPackProps(props, prop_types=None):
+  prop_types = prop_types or {}
+  prop_parts = [struct.pack('<I', len(props))]
+  for prop_name, prop_value in props.items():
+    if prop_name in prop_types:
+      prop_datatype, prop_bytes = TdmsPackTypedValue(prop_types[prop_name], prop_value)
+    else:
+      prop_datatype, prop_bytes = TdmsPackValue(prop_value)
+    prop_parts.append(TdmsPackString(prop_name) + struct.pack('<I', prop_datatype.value) + prop_bytes)
+  return b''.join(prop_parts)
+
+
+def TdmsNumpyDataType(dtype):
+  if dtype.kind == 'b':
+    return TdmsDataType.tdsTypeBoolean
+  for tdms_datatype, numpy_type in TdmsNumpyTypes.items():
+    if np.dtype(numpy_type) == dtype.newbyteorder('<'):
+      return tdms_datatype
+  raise TypeError("Cannot write channel data of dtype " + str(dtype))
+
+
+def TdmsPackRawData(data):
+  # strings stay string arrays until the segment is written, as TDMS puts all end offsets before all bytes
+  if isinstance(data, TdmsStringArray):
+    return TdmsDataType.tdsTypeString, TdmsStringArray.Concatenate([data]), len(data)
+
+  data = np.asarray(data).ravel()
+  if data.dtype.kind in 'UO':
+    value_bytes = [str(value).encode('utf-8') for value in data]
+    offsets = np.zeros(len(value_bytes) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in value_bytes], out=offsets[1:])
+    return TdmsDataType.tdsTypeString, TdmsStringArray(b''.join(value_bytes), offsets), len(data)
+  if data.dtype.kind == 'M':
+    return TdmsDataType.tdsTypeTimeStamp, TdmsPackTimeArray(data), len(data)
+  if data.dtype == TdmsTimeArrayDtype:
+    time_array = np.empty(len(data), dtype=[('fraction', '<u8'), ('seconds', '<i8')])
+    time_array['seconds']  = data['seconds']
+    time_array['fraction'] = data['fraction']
+    return TdmsDataType.tdsTypeTimeStamp, time_array, len(data)
+
+  # copied into little-endian order so later changes to the caller's array are not written
+  tdms_datatype = TdmsNumpyDataType(data.dtype)
+  return tdms_datatype, np.array(data, dtype=TdmsNumpyDtype(tdms_datatype, 'little'), copy=True), len(data)
+
+
+def TdmsRawDataBytes(raw_data):
+  if isinstance(raw_data, TdmsStringArray):
+    return 4*len(raw_data) + int(raw_data.offsets[-1] - raw_data.offsets[0])
+  return raw_data.nbytes if isinstance(raw_data, np.ndarray) else len(raw_data)
+
+
+def TdmsPackStringArray(string_array):
+  first = int(string_array.offsets[0])
+  end_offsets = (string_array.offsets[1:] - first).astype('<u4')
+  return end_offsets.tobytes() + bytes(string_array.buffer[first:int(string_array.offsets[-1])])
+
+
+def TdmsPackChannelChunk(raw_data_type, data):
+  if TdmsDataTypeIsNumpy(raw_data_type):  # keeps the channel's own type, e.g. booleans or floats with unit
+    return np.asarray(data, dtype=TdmsNumpyDtype(raw_data_type, 'little'))
+  _, raw_data, _ = TdmsPackRawData(data)
+  return raw_data
+
+
+def TdmsIterChannelRange(tdms_file, channel, start, stop, chunk_size):
+  for chunk_start in range(start, stop, chunk_size):
+    yield tdms_file.ReadChannelRange(channel, chunk_start, min(stop, chunk_start + chunk_size))
+
+
+def TdmsWriteChannelRaw(file, tdms_file, channel, chunk_size, start=0, stop=None):
+  stop = channel.num_values if stop is None else stop
+  if channel.raw_data_type != TdmsDataType.tdsTypeString:
+    for data in TdmsIterChannelRange(tdms_file, channel, start, stop, chunk_size):
+      file.write(TdmsPackChannelChunk(channel.raw_data_type, data))
+    return
+
+  # strings are written as all end offsets followed by all bytes, which takes two passes
+  end_offset = 0
+  for data in TdmsIterChannelRange(tdms_file, channel, start, stop, chunk_size):
+    file.write((data.offsets[1:] - data.offsets[0] + end_offset).astype('<u4'))
+    end_offset += int(data.offsets[-1] - data.offsets[0])
+  for data in TdmsIterChannelRange(tdms_file, channel, start, stop, chunk_size):
+    file.write(memoryview(data.buffer)[int(data.offsets[0]):int(data.offsets[-1])])
+
+
+def TdmsStringRuns(tdms_file, channel, chunk_size):
+  # string end offsets are U32, so a channel is split into runs of values whose bytes fit in one segment
+  runs = []
+  run_start, run_bytes, value_ind = 0, 0, 0
+  for data in tdms_file.iter_channel(channel.group_name, channel.name, chunk_size=chunk_size):
+    lengths = data.lengths()
+    chunk_ind = 0
+    while chunk_ind < len(lengths):
+      run_ends = run_bytes + np.cumsum(lengths[chunk_ind:])
+      num_fit = int(np.searchsorted(run_ends, TdmsStringSegmentMaxBytes, side='right'))
+      if num_fit == len(run_ends):
+        run_bytes = int(run_ends[-1])
+        break
+      if num_fit == 0 and run_bytes == 0:
+        raise ValueError("String value in " + channel.path + " is too long for a TDMS segment")
+
+      run_stop = value_ind + chunk_ind + num_fit
+      runs.append((run_start, run_stop, int(run_ends[num_fit-1]) if num_fit > 0 else run_bytes))
+      run_start, run_bytes = run_stop, 0
+      chunk_ind += num_fit
+    value_ind += len(lengths)
+
+  runs.append((run_start, value_ind, run_bytes))
+  return runs
+
+
+def TdmsRawIndex(raw_data_type, num_values, raw_size):
+  if num_values == 0:
+    return struct.pack('<I', 0xFFFFFFFF)
+  if TdsmDataLenIsVariable(raw_data_type):
+    return struct.pack('<IIIQQ', 28, raw_data_type.value, 1, num_values, raw_size)
+  return struct.pack('<IIIQ', 20, raw_data_type.value, 1, num_values)
+
+
+def TdmsParentPath(obj_path):
+  # the last '/' outside a quoted name separates a channel path from its group path
+  in_name = False
+  parent_end = 0
+  for char_ind, char in enumerate(obj_path):
+    if char == "'":
+      in_name = not in_name
+    elif char == '/' and not in_name:
+      parent_end = char_ind
+  return obj_path[:parent_end] or '/'
+
+
+def TdmsDefragmentLeadIn(meta, raw_size):
+  mask_settings = TdmsMaskSettings()
+  mask_settings.meta_in_seg     = True
+  mask_settings.new_obj_in_seg  = True
+  mask_settings.raw_data_in_seg = raw_size > 0
+  return struct.pack('<IIQQ', TdmsCreateMask(mask_settings), TdmsWriterVersion, len(meta) + raw_size, len(meta))
+
+
+def TdmsDefragmentFile(filepath, out_path=None, chunk_size=1000000, write_index=False):
+  out_path = filepath if out_path is None else out_path
+  tmp_path = out_path + '.defrag'
+
+  with TdmsFile(filepath, raw_timestamps=True) as tdms_file:
+    obj_parts = [TdmsPackString('/') + struct.pack('<I', 0xFFFFFFFF) + TdmsPackProps(tdms_file.props, tdms_file.prop_types)]
+    raw_channels = []   # (channel, start, stop) value ranges written in the first segment
+    split_runs = []     # further string runs, one segment each
+    raw_size = 0
+    for group_name, group in tdms_file.groups.items():
+      # original object paths are kept verbatim, the loader's group and channel names are cleaned copies
+      channel_paths = [channel.path for channel in group.channel_data.channels.values() if channel.path]
+      group_path = group.path or (TdmsParentPath(channel_paths[0]) if len(channel_paths) > 0 else TdmsObjectPath(group_name))
+      obj_parts.append(TdmsPackString(group_path) + struct.pack('<I', 0xFFFFFFFF) + TdmsPackProps(group.props, group.prop_types))
+
+      for channel in group.channel_data.channels.values():
+        if channel.raw_data_type == TdmsDataType.tdsTypeString and channel.num_values > 0:
+          string_bytes = sum(block.raw_size for block in channel.blocks) - 4*channel.num_values
+          if string_bytes > TdmsStringSegmentMaxBytes:
+            runs = TdmsStringRuns(tdms_file, channel, chunk_size)
+          else:
+            runs = [(0, channel.num_values, string_bytes)]
+          split_runs += [(channel, run) for run in runs[1:]]
+          run_start, run_stop, run_bytes = runs[0]
+          channel_size = 4*(run_stop - run_start) + run_bytes
+        else:
+          run_start, run_stop = 0, channel.num_values
+          channel_size = channel.num_values*TdmsDataTypeSize(channel.raw_data_type) if channel.num_values > 0 else 0
+        raw_index = TdmsRawIndex(channel.raw_data_type, run_stop - run_start, channel_size)
+        if run_stop > run_start:
+          raw_channels.append((channel, run_start, run_stop))
+          raw_size += channel_size
+        obj_parts.append(TdmsPackString(channel.path) + raw_index + TdmsPackProps(channel.props, channel.prop_types))
+
+    # first segment: all metadata up front, then every channel's values as one contiguous run
+    meta = struct.pack('<I', len(obj_parts)) + b''.join(obj_parts)
+    seg_headers = [TdmsDefragmentLeadIn(meta, raw_size) + meta]
+
+    with open(tmp_path, 'wb') as file:
+      file.write(b'TDSm' + seg_headers[0])
+      for channel, start, stop in raw_channels:
+        TdmsWriteChannelRaw(file, tdms_file, channel, chunk_size, start, stop)
+
+      # string channels too large for one segment continue in segments of their own
+      for channel, (run_start, run_stop, run_bytes) in split_runs:
+        channel_size = 4*(run_stop - run_start) + run_bytes
+        raw_index = TdmsRawIndex(channel.raw_data_type, run_stop - run_start, channel_size)
+        run_meta = struct.pack('<I', 1) + TdmsPackString(channel.path) + raw_index + struct.pack('<I', 0)
+        seg_headers.append(TdmsDefragmentLeadIn(run_meta, channel_size) + run_meta)
+        file.write(b'TDSm' + seg_headers[-1])
+        TdmsWriteChannelRaw(file, tdms_file, channel, chunk_size, run_start, run_stop)
+
+  os.replace(tmp_path, out_path)
+  index_path = TdmsIndexPath(out_path)
+  if write_index:
+    with open(index_path, 'wb') as index_file:
+      for seg_header in seg_headers:
+        index_file.write(b'TDSh' + seg_header)
+  elif os.path.isfile(index_path):  # the old index no longer describes the file
+    os.remove(index_path)
+  return out_path
+
+
 
 # =================================================================================================
 # TDMS Class/Enum Management Functions
@@ -353,6 +1967,56 @@ def TdsmDataLenIsVariable(tdms_datatype):
     return False
 
 
+TdmsNumpyTypes = {
+  TdmsDataType.tdsTypeI8:                   'i1',
+  TdmsDataType.tdsTypeI16:                  'i2',
+  TdmsDataType.tdsTypeI32:                  'i4',
+  TdmsDataType.tdsTypeI64:                  'i8',
+  TdmsDataType.tdsTypeU8:                   'u1',
+  TdmsDataType.tdsTypeU16:                  'u2',
+  TdmsDataType.tdsTypeU32:                  'u4',
+  TdmsDataType.tdsTypeU64:                  'u8',
+  TdmsDataType.tdsTypeSingleFloat:          'f4',
+  TdmsDataType.tdsTypeDoubleFloat:          'f8',
+  TdmsDataType.tdsTypeSingleFloatWithUnit:  'f4',
+  TdmsDataType.tdsTypeDoubleFloatWithUnit:  'f8',
+  TdmsDataType.tdsTypeBoolean:              'u1',
+}
+
+
+def TdmsDataTypeIsNumpy(tdms_datatype):
+  return tdms_datatype in TdmsNumpyTypes
+
+
+def TdmsNumpyDtype(tdms_datatype, endianness):
+  byte_order = '>' if endianness == 'big' else '<'
+  return np.dtype(byte_order + TdmsNumpyTypes[tdms_datatype])
+
+
+def TdmsNativeDtype(tdms_datatype):
+  if tdms_datatype == TdmsDataType.tdsTypeBoolean:
+    return np.dtype(bool)
+  return np.dtype('=' + TdmsNumpyTypes[tdms_datatype])
+
+
+TdmsDataTypeSizes = {tdms_datatype: np.dtype(numpy_type).itemsize for tdms_datatype, numpy_type in TdmsNumpyTypes.items()}
+TdmsDataTypeSizes.update({
+  TdmsDataType.tdsTypeTimeStamp:          16,
+  TdmsDataType.tdsTypeComplexSingleFloat: 8,
+  TdmsDataType.tdsTypeComplexDoubleFloat: 16,
+})
+
+
+def TdmsDataTypeSize(tdms_datatype):
+  return TdmsDataTypeSizes.get(tdms_datatype, 0)
+
+
+def TdmsRawDataSize(raw_data_type, raw_data_dim, raw_data_num, raw_data_size):
+  if TdsmDataLenIsVariable(raw_data_type):
+    return raw_data_size
+  return TdmsDataTypeSize(raw_data_type) * raw_data_dim * raw_data_num
+
+
 
 # =================================================================================================
 # TDMS Data Extraction Functions
@@ -413,12 +2077,50 @@ def TdmsExtractDoubleFloat(tdms_bytestream, start_ind, endianness):
 
 
 def TdmsExtractTimeEpoch(tdms_bytestream, start_ind, endianness):
-  scan_ind = 0
-  epoch_fraction, scan_ind  = TdmsExtractU64(tdms_bytestream, scan_ind, endianness)
-  epoch_seconds, scan_ind   = TdmsExtractI64(tdms_bytestream, scan_ind, endianness)
+  scan_ind = start_ind
+  if endianness == 'big':
+    epoch_seconds, scan_ind   = TdmsExtractI64(tdms_bytestream, scan_ind, endianness)
+    epoch_fraction, scan_ind  = TdmsExtractU64(tdms_bytestream, scan_ind, endianness)
+  else:
+    epoch_fraction, scan_ind  = TdmsExtractU64(tdms_bytestream, scan_ind, endianness)
+    epoch_seconds, scan_ind   = TdmsExtractI64(tdms_bytestream, scan_ind, endianness)
   return epoch_seconds + (epoch_fraction / 2**64), scan_ind
 
 
+TdmsTimeArrayDtype  = np.dtype([('seconds', '=i8'), ('fraction', '=u8')])
+TdmsEpochOffset     = 2082844800  # seconds from 1904-01-01 to 1970-01-01
+
+
+def TdmsExtractTimeArray(tdms_bytestream, start_ind, count, endianness, stride=0):
+  if endianness == 'big':
+    raw_dtype = np.dtype([('seconds', '>i8'), ('fraction', '>u8')])
+  else:
+    raw_dtype = np.dtype([('fraction', '<u8'), ('seconds', '<i8')])
+
+  if stride and stride != raw_dtype.itemsize and count > 0:
+    raw_array = np.ndarray(shape=(count,), dtype=raw_dtype, buffer=tdms_bytestream, offset=start_ind, strides=(stride,))
+    end_ind = start_ind + (count - 1)*stride + raw_dtype.itemsize
+  else:
+    raw_array = np.frombuffer(tdms_bytestream, dtype=raw_dtype, count=count, offset=start_ind)
+    end_ind = start_ind + count*raw_dtype.itemsize
+
+  time_array = np.empty(count, dtype=TdmsTimeArrayDtype)
+  time_array['seconds']  = raw_array['seconds']
+  time_array['fraction'] = raw_array['fraction']
+  return time_array, end_ind
+
+
+def TdmsTimeArrayToDatetime64(time_array):
+  # the top 32 bits of the fraction keep sub-nanosecond resolution without overflowing int64
+  fraction_ns = ((time_array['fraction'] >> np.uint64(32)).astype(np.int64) * 1000000000) >> 32
+  epoch_ns = (time_array['seconds'] - TdmsEpochOffset) * 1000000000 + fraction_ns
+  return epoch_ns.view('datetime64[ns]')
+
+
+def TdmsDatetime64ToDatetime(datetime64_array):
+  return [value.replace(tzinfo=timezone.utc) for value in datetime64_array.astype('datetime64[us]').tolist()]
+
+
 def TdmsExtractTimeDatetime(tdms_bytestream, start_ind, endianness):
   custom_epoch    = datetime(1904, 1, 1, 0, 0, 0, tzinfo=timezone.utc)
   epoch, scan_ind = TdmsExtractTimeEpoch(tdms_bytestream, start_ind, endianness)
@@ -432,7 +2134,17 @@ def TdmsExtractTimeString(tdms_bytestream, start_ind, endianness):
 
 
 def TdmsExtractString(tdms_bytestream, start_ind, str_len):
-  return tdms_bytestream[start_ind:start_ind+str_len].decode('utf-8'), start_ind+str_len
+  return str(tdms_bytestream[start_ind:start_ind+str_len], 'utf-8'), start_ind+str_len
+
+
+def TdmsExtractStringArray(tdms_bytestream, start_ind, count, endianness):
+  # string data starts with the end offset of every string, followed by the UTF-8 bytes
+  end_offsets, scan_ind = TdmsExtractArray(TdmsDataType.tdsTypeU32, tdms_bytestream, start_ind, count, endianness)
+  offsets = np.zeros(count + 1, dtype=np.int64)
+  offsets[1:] = end_offsets
+
+  buffer_len = int(offsets[-1])
+  return TdmsStringArray(bytes(tdms_bytestream[scan_ind:scan_ind+buffer_len]), offsets), scan_ind + buffer_len
 
 
 def TdmsExtractBool(tdms_bytestream, start_ind, endianness):
@@ -443,6 +2155,32 @@ def TdmsExtractDataType(tdms_bytestream, start_ind, endianness):
   return TdmsDataType(int.from_bytes(tdms_bytestream[start_ind:start_ind+4], byteorder=endianness, signed=False)), start_ind+4
 
 
+def TdmsViewArray(tdms_datatype, tdms_bytestream, start_ind, count, endianness, stride=0):
+  dtype = TdmsNumpyDtype(tdms_datatype, endianness)
+  if stride and stride != dtype.itemsize and count > 0:
+    raw_array = np.ndarray(shape=(count,), dtype=dtype, buffer=tdms_bytestream, offset=start_ind, strides=(stride,))
+    return raw_array, start_ind + (count - 1)*stride + dtype.itemsize
+
+  raw_array = np.frombuffer(tdms_bytestream, dtype=dtype, count=count, offset=start_ind)
+  return raw_array, start_ind + count*dtype.itemsize
+
+
+def TdmsExtractArray(tdms_datatype, tdms_bytestream, start_ind, count, endianness, stride=0):
+  raw_array, end_ind = TdmsViewArray(tdms_datatype, tdms_bytestream, start_ind, count, endianness, stride=stride)
+  if tdms_datatype == TdmsDataType.tdsTypeBoolean:
+    return raw_array != 0, end_ind
+  return raw_array.astype(raw_array.dtype.newbyteorder('=')), end_ind
+
+
+def TdmsExtractArrayInto(tdms_datatype, tdms_bytestream, start_ind, count, endianness, out, stride=0):
+  raw_array, end_ind = TdmsViewArray(tdms_datatype, tdms_bytestream, start_ind, count, endianness, stride=stride)
+  if tdms_datatype == TdmsDataType.tdsTypeBoolean:
+    np.not_equal(raw_array, 0, out=out)
+  else:
+    out[...] = raw_array
+  return end_ind
+
+
 def TdmsExtractAuto(tdms_datatype, tdms_bytestream, start_ind, endianness):
   if tdms_datatype == TdmsDataType.tdsTypeI8:
     return TdmsExtractI8(tdms_bytestream, start_ind, endianness)
@@ -475,14 +2213,15 @@ def TdmsExtractAuto(tdms_datatype, tdms_bytestream, start_ind, endianness):
     return None
 
 
-def TdmsExtractMaskSettings(mask):
-  mask_meta_in_seg        = (1 << 1)
-  mask_raw_data_in_seg    = (1 << 3)
-  mask_Daqmx_data_in_seg  = (1 << 7)
-  mask_data_interleaved   = (1 << 5)
-  mask_data_is_big_endian = (1 << 6)
-  mask_new_obj_in_seg     = (1 << 2)
+mask_meta_in_seg        = (1 << 1)
+mask_raw_data_in_seg    = (1 << 3)
+mask_Daqmx_data_in_seg  = (1 << 7)
+mask_data_interleaved   = (1 << 5)
+mask_data_is_big_endian = (1 << 6)
+mask_new_obj_in_seg     = (1 << 2)
+
 
+def TdmsExtractMaskSettings(mask):
   seg_mask_settings = TdmsMaskSettings()
   if (mask & mask_meta_in_seg):
     seg_mask_settings.meta_in_seg = True
@@ -501,6 +2240,23 @@ def TdmsExtractMaskSettings(mask):
   return seg_mask_settings
 
 
+def TdmsCreateMask(mask_settings):
+  mask = 0
+  if mask_settings.meta_in_seg:
+    mask |= mask_meta_in_seg
+  if mask_settings.raw_data_in_seg:
+    mask |= mask_raw_data_in_seg
+  if mask_settings.Daqmx_data_in_seg:
+    mask |= mask_Daqmx_data_in_seg
+  if mask_settings.data_interleaved:
+    mask |= mask_data_interleaved
+  if mask_settings.data_is_big_endian:
+    mask |= mask_data_is_big_endian
+  if mask_settings.new_obj_in_seg:
+    mask |= mask_new_obj_in_seg
+  return mask
+
+
 
 # =================================================================================================
 # General Use Functions
@@ -542,12 +2298,12 @@ def TdmsCreateCleanPath(input_string):
 # TDMS File Loading Functions
 # =================================================================================================
 
-def TdmsValidateSegment(tdms_bytestream):
+def TdmsValidateSegment(tdms_bytestream, valid_tag='TDSm'):
   tdms_status = True
   toc_mask, version, segment_len, raw_start = 0, 0, 0, 0
   toc_mask_settings = None
 
-  valid_tdms_tag  = 'TDSm'.encode('utf-8')
+  valid_tdms_tag  = valid_tag.encode('utf-8')
   tdms_tag        = tdms_bytestream[:4]
   if tdms_tag != valid_tdms_tag:
     print("Invalid tdms file: Tag is not valid")
@@ -565,12 +2321,257 @@ def TdmsValidateSegment(tdms_bytestream):
   return tdms_status, toc_mask_settings, version, segment_len, raw_start
 
 
-def TdmsLoadFile(filepath):
-  loader = TdmsLoader()
-  loader.LoadFile(filepath)
+@contextmanager
+def TdmsOpenBytestream(filepath, use_mmap=True):
+  with open(filepath, 'rb') as file:
+    if not use_mmap:
+      yield file.read()
+      return
+
+    if os.fstat(file.fileno()).st_size == 0:
+      yield b''
+      return
+
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+      if hasattr(mmap, 'MADV_SEQUENTIAL'):
+        file_map.madvise(mmap.MADV_SEQUENTIAL)
+
+      with memoryview(file_map) as file_content:
+        yield file_content
+
+
+def TdmsIndexPath(filepath):
+  return str(filepath) + '_index'
+
+
+def TdmsOpenFile(filepath, use_mmap=True, use_index=True, cache_dir=None, raw_timestamps=False, stats=None):
+  layout_cache = TdmsLayoutCache(cache_dir) if cache_dir is not None else None
+  return TdmsFile(filepath, use_mmap=use_mmap, use_index=use_index, layout_cache=layout_cache, raw_timestamps=raw_timestamps, stats=stats)
+
+
+def TdmsIterChannel(filepath, group_name, channel_name, chunk_size=1000000, use_index=True):
+  with TdmsFile(filepath, use_index=use_index) as tdms_file:
+    yield from tdms_file.iter_channel(group_name, channel_name, chunk_size=chunk_size)
+
+
+def TdmsObjectSelected(group_name=None, channel_name=None, groups=None, channels=None):
+  if group_name is None:  # the root is always kept
+    return True
+  if groups is not None and group_name not in groups:
+    return False
+  if channel_name is not None and channels is not None and channel_name not in channels:
+    return False
+  return True
+
+
+def TdmsLoadFile(filepath, use_mmap=True, workers=None, raw_timestamps=False, groups=None, channels=None, stats=None):
+  if workers is not None:
+    with TdmsFile(filepath, use_mmap=use_mmap, raw_timestamps=raw_timestamps, stats=stats) as tdms_file:
+      tdms_file.ReadAllChannels(workers=workers, groups=groups, channels=channels)
+      return TdmsFileUtil.TdmsFileToRoot(tdms_file, groups=groups, channels=channels)
+
+  loader = TdmsLoader(raw_timestamps=raw_timestamps, groups=groups, channels=channels, stats=stats)
+  loader.LoadFile(filepath, use_mmap=use_mmap)
 
   return loader.root
 
 
-file1 = TdmsLoadFile(r'..\..\tests\Test_Log-20240731_122619.tdms')
-file2 = TdmsLoadFile(r'..\..\tests\Test_Log-20240806_150205.tdms')
+
+# =================================================================================================
+# TDMS Multi-File Loading Functions
+# =================================================================================================
+
+class TdmsLoadResult:
+  def __init__(self, filepath):
+    self.filepath = filepath
+    self.root     = None
+    self.error    = None
+
+  @property
+  def ok(self):
+    return self.error is None
+
+
+# channels are decoded straight into typed arrays, which pickle far smaller than lists of numbers
+def TdmsLoadFileResult(filepath):
+  result = TdmsLoadResult(filepath)
+  try:
+    with TdmsFile(filepath) as tdms_file:
+      tdms_file.ReadAllChannels(workers=1)
+      result.root = TdmsFileUtil.TdmsFileToRoot(tdms_file)
+  except Exception:
+    result.error = traceback.format_exc()
+  return result
+
+
+def TdmsLoadFiles(filepaths, workers=None, progress=None):
+  filepaths = list(filepaths)
+  results = [None]*len(filepaths)
+
+  if workers == 1:
+    for file_ind, filepath in enumerate(filepaths):
+      results[file_ind] = TdmsLoadFileResult(filepath)
+      if progress is not None:
+        progress(results[file_ind], file_ind + 1, len(filepaths))
+    return results
+
+  with ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = {executor.submit(TdmsLoadFileResult, filepath): file_ind for file_ind, filepath in enumerate(filepaths)}
+    for done_count, future in enumerate(as_completed(futures), 1):
+      file_ind = futures[future]
+      results[file_ind] = future.result()
+      if progress is not None:
+        progress(results[file_ind], done_count, len(filepaths))
+  return results
+
+
+
+
+# =================================================================================================
+# TDMS Conversion Functions
+# =================================================================================================
+
+TdmsConvertBatchSize  = 1000000
+TdmsConvertFormats    = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def TdmsImportArrow():
+  try:
+    import pyarrow
+  except ImportError:
+    raise ImportError("TDMS conversion requires pyarrow, install it with 'pip install niftytdms[arrow]'") from None
+  return pyarrow
+
+
+def TdmsPropsToJson(props):
+  return json.dumps(props, default=str)
+
+
+def TdmsArrowArray(data, num_rows, arrow_type=None):
+  pa = TdmsImportArrow()
+  if len(data) == 0 and arrow_type is not None:
+    return pa.nulls(num_rows, arrow_type)
+
+  if isinstance(data, TdmsStringArray):  # offsets and bytes are handed over without decoding any strings
+    first, last = int(data.offsets[0]), int(data.offsets[-1])
+    array = pa.LargeStringArray.from_buffers(len(data), pa.py_buffer(data.offsets - first), pa.py_buffer(memoryview(data.buffer)[first:last]))
+  else:
+    array = pa.array(data)
+
+  # channels shorter than their group are padded with nulls
+  if len(array) < num_rows:
+    array = pa.concat_arrays([array, pa.nulls(num_rows - len(array), array.type)])
+  return array
+
+
+def TdmsArrowSchema(tdms_file, group_name, channel_names, arrow_types):
+  pa = TdmsImportArrow()
+  group = tdms_file.groups[group_name]
+  fields = [pa.field(channel_name, arrow_type, metadata={'tdms_props': TdmsPropsToJson(group.channel_props[channel_name])})
+            for channel_name, arrow_type in zip(channel_names, arrow_types)]
+  return pa.schema(fields, metadata={
+    'tdms_group':       group_name,
+    'tdms_file_props':  TdmsPropsToJson(tdms_file.props),
+    'tdms_group_props': TdmsPropsToJson(group.props),
+  })
+
+
+def TdmsGroupArrowBatches(tdms_file, group_name, batch_size=TdmsConvertBatchSize, channels=None):
+  pa = TdmsImportArrow()
+  group = tdms_file.groups[group_name]
+  channel_names = [channel_name for channel_name in group.channels if TdmsObjectSelected(group_name, channel_name, channels=channels)]
+  group_channels = [group.channel_data.channels[channel_name] for channel_name in channel_names]
+  num_rows = max([len(channel) for channel in group_channels], default=0)
+
+  schema = None
+  for start in range(0, max(num_rows, 1), batch_size):
+    stop = min(start + batch_size, num_rows)
+    arrays = []
+    for channel_ind, channel in enumerate(group_channels):
+      data = tdms_file.ReadChannelRange(channel, min(start, len(channel)), min(stop, len(channel)))
+      arrays.append(TdmsArrowArray(data, stop - start, schema.field(channel_ind).type if schema is not None else None))
+
+    if schema is None:
+      schema = TdmsArrowSchema(tdms_file, group_name, channel_names, [array.type for array in arrays])
+    yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def TdmsIterArrowBatches(filepath, batch_size=TdmsConvertBatchSize, groups=None, channels=None, use_index=True):
+  with TdmsFile(filepath, use_index=use_index) as tdms_file:
+    for group_name in tdms_file.groups:
+      if TdmsObjectSelected(group_name, groups=groups):
+        for batch in TdmsGroupArrowBatches(tdms_file, group_name, batch_size=batch_size, channels=channels):
+          yield group_name, batch
+
+
+def TdmsOpenArrowWriter(out_path, schema, file_format):
+  pa = TdmsImportArrow()
+  if file_format == 'parquet':
+    import pyarrow.parquet
+    return pyarrow.parquet.ParquetWriter(out_path, schema)
+  return pa.ipc.new_file(out_path, schema)
+
+
+def TdmsConvertFile(filepath, out_dir, file_format='parquet', batch_size=TdmsConvertBatchSize, groups=None, channels=None, use_index=True):
+  if file_format not in TdmsConvertFormats:
+    raise ValueError("Unknown conversion format: " + str(file_format))
+  os.makedirs(out_dir, exist_ok=True)
+  file_stem = os.path.splitext(os.path.basename(filepath))[0]
+
+  # one output file per group, since each group is its own table
+  out_paths = {}
+  writer = None
+  try:
+    for group_name, batch in TdmsIterArrowBatches(filepath, batch_size=batch_size, groups=groups, channels=channels, use_index=use_index):
+      if group_name not in out_paths:
+        if writer is not None:
+          writer.close()
+        out_paths[group_name] = os.path.join(out_dir, file_stem + '.' + group_name.replace(os.sep, '_') + TdmsConvertFormats[file_format])
+        writer = TdmsOpenArrowWriter(out_paths[group_name], batch.schema, file_format)
+      writer.write_batch(batch)
+  finally:
+    if writer is not None:
+      writer.close()
+  return out_paths
+
+
+def TdmsImportPandas():
+  try:
+    import pandas
+  except ImportError:
+    raise ImportError("DataFrame export requires pandas, install it with 'pip install niftytdms[pandas]'") from None
+  return pandas
+
+
+def TdmsWaveformIndex(channel_props, num_rows):
+  pd = TdmsImportPandas()
+  start_time = channel_props['wf_start_time']
+  if isinstance(start_time, datetime):
+    start_time = start_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+  offsets_ns = np.round(np.arange(num_rows) * (channel_props['wf_increment'] * 1e9)).astype(np.int64)
+  return pd.DatetimeIndex(np.datetime64(start_time, 'ns') + offsets_ns.view('timedelta64[ns]'), name='time')
+
+
+def TdmsGroupToDataFrame(group, time_index=False):
+  pd = TdmsImportPandas()
+  columns = {}
+  for channel_name in group.channels:
+    data = group.channel_data[channel_name]
+    columns[channel_name] = data.tolist() if isinstance(data, TdmsStringArray) else data
+
+  num_rows = max([len(column) for column in columns.values()], default=0)
+  for channel_name, column in columns.items():
+    if len(column) < num_rows:  # shorter channels are padded with missing values, which needs a copy
+      columns[channel_name] = pd.Series(column).reindex(range(num_rows))
+
+  # typed arrays become columns without being copied
+  data_frame = pd.DataFrame(columns, copy=False)
+
+  if time_index:
+    waveform_channels = [channel_name for channel_name in group.channels
+                         if 'wf_start_time' in group.channel_props[channel_name] and 'wf_increment' in group.channel_props[channel_name]]
+    if len(waveform_channels) == 0:
+      raise ValueError("Group has no channel with wf_start_time and wf_increment properties")
+    data_frame.index = TdmsWaveformIndex(group.channel_props[waveform_channels[0]], num_rows)
+  return data_frame
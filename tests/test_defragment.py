@@ -0,0 +1,176 @@
+import os
+import shutil
+import struct
+import sys
+
+import numpy as np
+import pytest
+
+import niftytdms.niftytdms
+from niftytdms import (TdmsDataType, TdmsDefragmentFile, TdmsIndexPath, TdmsLoader, TdmsLoadFile, TdmsOpenFile, TdmsPackString,
+                       TdmsStringArray, TdmsWriter)
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from tdms_synth import SynthChannelValues, WriteSynthFile
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Test_Log-20240806_165430.tdms')
+SYNTH_TYPES = (TdmsDataType.tdsTypeDoubleFloat, TdmsDataType.tdsTypeTimeStamp, TdmsDataType.tdsTypeI16, TdmsDataType.tdsTypeU8)
+
+
+def AssertSameData(data, expected):
+  if isinstance(expected, TdmsStringArray):
+    assert data.tolist() == expected.tolist()
+  else:
+    np.testing.assert_array_equal(data, expected)
+
+
+def AssertSameFile(filepath, expected_path):
+  root = TdmsLoadFile(filepath)
+  expected = TdmsLoadFile(expected_path)
+  assert root.props == expected.props
+  assert list(root.groups) == list(expected.groups)
+  for group_name, expected_group in expected.groups.items():
+    group = root.groups[group_name]
+    assert group.props == expected_group.props
+    assert group.channels == expected_group.channels
+    assert group.channel_props == expected_group.channel_props
+    for channel_name in expected_group.channels:
+      AssertSameData(group.channel_data[channel_name], expected_group.channel_data[channel_name])
+
+  # object paths are written as they were, not as the loader's cleaned names
+  with TdmsOpenFile(filepath, use_index=False) as tdms_file, TdmsOpenFile(expected_path, use_index=False) as expected_file:
+    for group_name, expected_group in expected_file.groups.items():
+      assert tdms_file.groups[group_name].path == expected_group.path
+      for channel_name, expected_channel in expected_group.channel_data.channels.items():
+        assert tdms_file.channel(group_name, channel_name).path == expected_channel.path
+    return len(tdms_file.segments)
+
+
+def test_sample_log(tmp_path):
+  out_path = str(tmp_path / 'sample.tdms')
+  assert TdmsDefragmentFile(SAMPLE_PATH, out_path=out_path) == out_path
+  assert AssertSameFile(out_path, SAMPLE_PATH) == 1
+  with TdmsOpenFile(out_path) as tdms_file:
+    assert tdms_file.groups['Test_Details'].path == "/'Test Details'"
+    assert tdms_file.channel('10Hz_Test_Log', 'AI0_Inlet_Gas_pressure').path == "/'10Hz Test Log'/'AI0 - Inlet Gas pressure'"
+
+
+def test_writer_file_in_place(tmp_path):
+  filepath = str(tmp_path / 'fragmented.tdms')
+  times = np.datetime64('2024-08-06T16:54:30', 'ns') + np.arange(300)*np.timedelta64(1001, 'ns')
+  with TdmsWriter(filepath, segment_size=200) as writer:
+    writer.write_props({'name': 'run', 'gain': 1.5})
+    writer.write_props({'operator': 'µ'}, "it's a group")
+    for i in range(30):
+      writer.write_channel("it's a group", 'AI0 - pressure', np.arange(i*10, (i+1)*10, dtype=np.float32))
+      writer.write_channel("it's a group", 'time', times[i*10:(i+1)*10])
+      writer.write_channel('Log', 'message', ['line ' + str(i), '', 'µ'*i])
+  original_path = str(tmp_path / 'original.tdms')
+  shutil.copyfile(filepath, original_path)
+
+  assert TdmsDefragmentFile(filepath, write_index=True) == filepath
+  assert AssertSameFile(filepath, original_path) == 1
+  with TdmsOpenFile(filepath) as tdms_file:
+    assert tdms_file.from_index
+    assert tdms_file.groups['its_a_group'].path == "/'it''s a group'"
+
+  TdmsDefragmentFile(filepath)   # defragmenting again without an index removes the old one
+  assert not os.path.exists(TdmsIndexPath(filepath))
+  AssertSameFile(filepath, original_path)
+
+
+@pytest.mark.parametrize('interleaved', [False, True])
+@pytest.mark.parametrize('endianness', ['little', 'big'])
+def test_synthetic_layouts(tmp_path, interleaved, endianness):
+  filepath = str(tmp_path / 'synth.tdms')
+  WriteSynthFile(filepath, num_segments=20, num_channels=6, samples=50, data_types=SYNTH_TYPES, interleaved=interleaved,
+                 endianness=endianness, raw_only=True)
+  out_path = str(tmp_path / 'defragmented.tdms')
+  TdmsDefragmentFile(filepath, out_path=out_path)
+  assert AssertSameFile(out_path, filepath) == 1
+
+
+def test_strings_and_empty_channels(tmp_path):
+  filepath = str(tmp_path / 'strings.tdms')
+  WriteSynthFile(filepath, num_segments=10, num_channels=4, samples=30, data_types=(TdmsDataType.tdsTypeString, TdmsDataType.tdsTypeI32))
+  with open(filepath, 'ab') as file:   # a channel declared with properties but no values
+    with TdmsWriter(str(tmp_path / 'empty.tdms')) as writer:
+      writer.write_props({'unit_string': 'V'}, 'Synthetic', 'empty')
+    with open(str(tmp_path / 'empty.tdms'), 'rb') as empty_file:
+      file.write(empty_file.read())
+
+  out_path = str(tmp_path / 'defragmented.tdms')
+  TdmsDefragmentFile(filepath, out_path=out_path, chunk_size=7)
+  AssertSameFile(out_path, filepath)
+
+
+def WriteSegment(filepath, objs, raw=b''):
+  # objs are (path, raw index bytes, [(prop name, TDMS data type, value bytes)]) in file order
+  obj_parts = []
+  for obj_path, raw_index, props in objs:
+    prop_parts = [TdmsPackString(prop_name) + struct.pack('<I', prop_datatype.value) + prop_bytes for prop_name, prop_datatype, prop_bytes in props]
+    obj_parts.append(TdmsPackString(obj_path) + raw_index + struct.pack('<I', len(props)) + b''.join(prop_parts))
+  meta = struct.pack('<I', len(objs)) + b''.join(obj_parts)
+  with open(filepath, 'wb') as file:
+    file.write(b'TDSm' + struct.pack('<IIQQ', 0xE, 4713, len(meta) + len(raw), len(meta)) + meta + raw)
+
+
+def test_group_declared_only_by_channel_path(tmp_path):
+  filepath = str(tmp_path / 'implicit_group.tdms')
+  raw_index = struct.pack('<IIIQ', 20, TdmsDataType.tdsTypeI32.value, 1, 3)
+  WriteSegment(filepath, [("/'My Group'/'ch 1'", raw_index, [])], np.arange(3, dtype='<i4').tobytes())
+
+  out_path = str(tmp_path / 'defragmented.tdms')
+  TdmsDefragmentFile(filepath, out_path=out_path)
+  with open(out_path, 'rb') as file:
+    seg = TdmsLoader().ScanSegment(file.read(), 0)
+  assert seg.num_objs == 3   # root, one group and its channel
+  assert seg.objs['My_Group'].path == "/'My Group'"
+  np.testing.assert_array_equal(TdmsLoadFile(out_path).groups['My_Group'].channel_data['ch_1'], np.arange(3))
+
+
+def test_property_types_are_kept(tmp_path):
+  filepath = str(tmp_path / 'typed_props.tdms')
+  props = [
+    ('u64',   TdmsDataType.tdsTypeU64,          struct.pack('<Q', 2**63 + 5)),
+    ('u8',    TdmsDataType.tdsTypeU8,           struct.pack('<B', 200)),
+    ('u32',   TdmsDataType.tdsTypeU32,          struct.pack('<I', 7)),
+    ('sgl',   TdmsDataType.tdsTypeSingleFloat,  struct.pack('<f', 0.25)),
+    ('i16',   TdmsDataType.tdsTypeI16,          struct.pack('<h', -3)),
+    ('flag',  TdmsDataType.tdsTypeBoolean,      struct.pack('<B', 1)),
+    ('time',  TdmsDataType.tdsTypeTimeStamp,    struct.pack('<Qq', 1 << 63, 3000000000)),
+  ]
+  raw_index = struct.pack('<IIIQ', 20, TdmsDataType.tdsTypeDoubleFloat.value, 1, 2)
+  WriteSegment(filepath, [('/', struct.pack('<I', 0xFFFFFFFF), props), ("/'G'", struct.pack('<I', 0xFFFFFFFF), props),
+                          ("/'G'/'c'", raw_index, props)], np.array([1.5, 2.5], dtype='<f8').tobytes())
+
+  out_path = str(tmp_path / 'defragmented.tdms')
+  TdmsDefragmentFile(filepath, out_path=out_path, write_index=True)
+  AssertSameFile(out_path, filepath)
+  for use_index in (False, True):
+    with TdmsOpenFile(out_path, use_index=use_index) as tdms_file, TdmsOpenFile(filepath, use_index=False) as original:
+      assert tdms_file.from_index == use_index
+      for objs in ((tdms_file, original), (tdms_file.groups['G'], original.groups['G']), (tdms_file.channel('G', 'c'), original.channel('G', 'c'))):
+        assert objs[0].prop_types == objs[1].prop_types
+        assert objs[0].props == objs[1].props
+      assert tdms_file.props['u64'] == 2**63 + 5
+
+
+def test_string_channel_split_across_segments(tmp_path, monkeypatch):
+  monkeypatch.setattr(niftytdms.niftytdms, 'TdmsStringSegmentMaxBytes', 100)
+  filepath = str(tmp_path / 'strings.tdms')
+  synth_args = dict(num_segments=8, num_channels=3, samples=20, data_types=(TdmsDataType.tdsTypeString, TdmsDataType.tdsTypeI32))
+  WriteSynthFile(filepath, **synth_args)
+
+  out_path = str(tmp_path / 'defragmented.tdms')
+  TdmsDefragmentFile(filepath, out_path=out_path, chunk_size=7, write_index=True)
+  num_segments = AssertSameFile(out_path, filepath)
+  assert num_segments > 2
+
+  _, channel_values = SynthChannelValues(**synth_args)
+  with TdmsOpenFile(out_path) as tdms_file:
+    assert tdms_file.from_index
+    for channel_name in ('ch0', 'ch2'):
+      channel = tdms_file.channel('Synthetic', channel_name)
+      assert channel.data.tolist() == [value for part in channel_values[channel_name] for value in part]
+      assert max(block.raw_size - 4*block.raw_data_num for block in channel.blocks) <= 100
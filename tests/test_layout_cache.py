@@ -0,0 +1,48 @@
+import os
+import pickle
+
+import numpy as np
+
+from niftytdms import TdmsLayoutCache, TdmsOpenFile
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Test_Log-20240806_165430.tdms')
+
+
+def test_cached_layout_matches_scan(tmp_path):
+  cache_dir = str(tmp_path / 'cache')
+  with TdmsOpenFile(SAMPLE_PATH, cache_dir=cache_dir) as stored:
+    assert not stored.from_cache
+  with TdmsOpenFile(SAMPLE_PATH, cache_dir=cache_dir) as cached, TdmsOpenFile(SAMPLE_PATH, use_index=False) as scanned:
+    assert cached.from_cache
+    assert cached.props == scanned.props
+    assert cached.prop_types == scanned.prop_types
+    assert cached.segments == scanned.segments
+    for group_name, scanned_group in scanned.groups.items():
+      assert cached.groups[group_name].props == scanned_group.props
+      assert cached.groups[group_name].path == scanned_group.path
+      assert cached.groups[group_name].prop_types == scanned_group.prop_types
+      for channel_name, scanned_channel in scanned_group.channel_data.channels.items():
+        channel = cached.channel(group_name, channel_name)
+        assert (channel.path, channel.props, channel.prop_types) == (scanned_channel.path, scanned_channel.props, scanned_channel.prop_types)
+        assert channel.raw_data_type == scanned_channel.raw_data_type
+        if channel.raw_data_type.name == 'tdsTypeString':
+          assert channel.data.tolist() == scanned_channel.data.tolist()
+        else:
+          np.testing.assert_array_equal(channel.data, scanned_channel.data)
+
+
+def test_pickled_entry_is_not_executed(tmp_path):
+  probe_dir = str(tmp_path / 'executed')
+
+  class PickleProbe:
+    def __reduce__(self):   # unpickling would create probe_dir
+      return (os.mkdir, (probe_dir,))
+
+  cache_dir = str(tmp_path / 'cache')
+  layout_cache = TdmsLayoutCache(cache_dir)
+  with open(layout_cache.CachePath(TdmsLayoutCache.CacheKey(SAMPLE_PATH)), 'wb') as cache_file:
+    pickle.dump(PickleProbe(), cache_file)
+
+  with TdmsOpenFile(SAMPLE_PATH, cache_dir=cache_dir) as tdms_file:
+    assert not tdms_file.from_cache
+  assert not os.path.exists(probe_dir)
@@ -0,0 +1,128 @@
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pytest
+
+from niftytdms import TdmsDataType, TdmsEpochOffset, TdmsExtractTimeDatetime, TdmsLoadFile, TdmsNativeDtype, TdmsOpenFile, TdmsStringArray
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+from tdms_synth import SynthChannelValues, WriteSynthFile
+
+
+def ExpectedData(tdms_datatype, parts):
+  if tdms_datatype == TdmsDataType.tdsTypeString:
+    return [value for part in parts for value in part]
+  if tdms_datatype == TdmsDataType.tdsTypeTimeStamp:
+    return np.concatenate([seconds for seconds, _ in parts]), np.concatenate([fraction for _, fraction in parts])
+  return np.concatenate(parts).astype(TdmsNativeDtype(tdms_datatype))
+
+
+def AssertChannelData(data, tdms_datatype, parts):
+  expected = ExpectedData(tdms_datatype, parts)
+  if tdms_datatype == TdmsDataType.tdsTypeString:
+    assert isinstance(data, TdmsStringArray)
+    assert data.tolist() == expected
+  elif tdms_datatype == TdmsDataType.tdsTypeTimeStamp:   # compared as the raw seconds and fraction fields
+    np.testing.assert_array_equal(data['seconds'], expected[0])
+    np.testing.assert_array_equal(data['fraction'], expected[1])
+  else:
+    assert data.dtype == expected.dtype
+    np.testing.assert_array_equal(data, expected)
+
+
+def AssertMatchesSynth(filepath, **synth_args):
+  channels, channel_values = SynthChannelValues(**synth_args)
+  channel_data = TdmsLoadFile(filepath, raw_timestamps=True).groups['Synthetic'].channel_data
+  assert list(channel_data) == [channel_name for channel_name, _ in channels]
+  for channel_name, tdms_datatype in channels:
+    AssertChannelData(channel_data[channel_name], tdms_datatype, channel_values[channel_name])
+
+  with TdmsOpenFile(filepath, use_index=False, raw_timestamps=True) as tdms_file:
+    for channel_name, tdms_datatype in channels:
+      AssertChannelData(tdms_file.channel('Synthetic', channel_name).data, tdms_datatype, channel_values[channel_name])
+
+
+def test_unfinished_last_segment(tmp_path):
+  filepath = str(tmp_path / 'unfinished.tdms')
+  synth_args = dict(num_segments=3, num_channels=2, samples=5)
+  WriteSynthFile(filepath, **synth_args)
+  with TdmsOpenFile(filepath, use_index=False) as tdms_file:
+    last_start = tdms_file.segments[-1][0]
+
+  # a write cut short leaves the segment length at all ones, so the segment runs to the end of the file
+  with open(filepath, 'r+b') as file:
+    file.seek(last_start + 12)
+    file.write(struct.pack('<Q', 0xFFFFFFFFFFFFFFFF))
+  AssertMatchesSynth(filepath, **synth_args)
+
+
+NUMERIC_TYPES = (TdmsDataType.tdsTypeDoubleFloat, TdmsDataType.tdsTypeI32, TdmsDataType.tdsTypeU16, TdmsDataType.tdsTypeSingleFloat,
+                 TdmsDataType.tdsTypeI8, TdmsDataType.tdsTypeBoolean)
+
+
+@pytest.mark.parametrize('raw_only', [False, True])
+@pytest.mark.parametrize('endianness', ['little', 'big'])
+def test_interleaved(tmp_path, endianness, raw_only):
+  filepath = str(tmp_path / 'interleaved.tdms')
+  synth_args = dict(num_segments=7, num_channels=8, samples=40, data_types=NUMERIC_TYPES + (TdmsDataType.tdsTypeTimeStamp,))
+  WriteSynthFile(filepath, interleaved=True, endianness=endianness, raw_only=raw_only, **synth_args)
+  AssertMatchesSynth(filepath, **synth_args)
+
+
+def test_contiguous_big_endian(tmp_path):
+  filepath = str(tmp_path / 'big_endian.tdms')
+  synth_args = dict(num_segments=5, num_channels=6, samples=30, data_types=NUMERIC_TYPES)
+  WriteSynthFile(filepath, endianness='big', raw_only=True, **synth_args)
+  AssertMatchesSynth(filepath, **synth_args)
+
+
+TIME_TYPES = (TdmsDataType.tdsTypeTimeStamp, TdmsDataType.tdsTypeDoubleFloat)
+
+
+@pytest.mark.parametrize('endianness', ['little', 'big'])
+def test_timestamp_channels(tmp_path, endianness):
+  filepath = str(tmp_path / 'timestamps.tdms')
+  synth_args = dict(num_segments=4, num_channels=4, samples=50, data_types=TIME_TYPES)
+  WriteSynthFile(filepath, endianness=endianness, **synth_args)
+  AssertMatchesSynth(filepath, **synth_args)
+
+  # datetime64 values are the raw fields converted independently, to within the nanosecond the conversion truncates
+  channels, channel_values = SynthChannelValues(**synth_args)
+  channel_data = TdmsLoadFile(filepath).groups['Synthetic'].channel_data
+  for channel_name, tdms_datatype in channels:
+    if tdms_datatype != TdmsDataType.tdsTypeTimeStamp:
+      continue
+    seconds, fraction = ExpectedData(tdms_datatype, channel_values[channel_name])
+    expected_ns = [(int(s) - TdmsEpochOffset)*10**9 + (int(f)*10**9 >> 64) for s, f in zip(seconds, fraction)]
+    assert channel_data[channel_name].dtype == np.dtype('datetime64[ns]')
+    assert np.max(np.abs(channel_data[channel_name].view(np.int64) - np.array(expected_ns))) <= 1
+
+
+def test_timestamp_value_at_offset():
+  raw = b'\xff'*5 + struct.pack('<Qq', 1 << 63, TdmsEpochOffset + 1700000000)
+  value, scan_ind = TdmsExtractTimeDatetime(raw, 5, 'little')
+  assert value == datetime(2023, 11, 14, 22, 13, 20, 500000, tzinfo=timezone.utc)
+  assert scan_ind == 21
+
+
+STRING_TYPES = (TdmsDataType.tdsTypeString, TdmsDataType.tdsTypeI32)
+
+
+@pytest.mark.parametrize('endianness', ['little', 'big'])
+def test_string_channels(tmp_path, endianness):
+  filepath = str(tmp_path / 'strings.tdms')
+  synth_args = dict(num_segments=6, num_channels=4, samples=25, data_types=STRING_TYPES)
+  WriteSynthFile(filepath, endianness=endianness, **synth_args)
+  AssertMatchesSynth(filepath, **synth_args)
+
+  _, channel_values = SynthChannelValues(**synth_args)
+  expected = ExpectedData(TdmsDataType.tdsTypeString, channel_values['ch0'])
+  with TdmsOpenFile(filepath, use_index=False) as tdms_file:
+    channel = tdms_file.channel('Synthetic', 'ch0')
+    assert channel[20:60].tolist() == expected[20:60]   # crosses segment boundaries without loading the channel
+    assert channel[-1] == expected[-1]
+    np.testing.assert_array_equal(channel.data.equals('µs-step'), [value == 'µs-step' for value in expected])
+    np.testing.assert_array_equal(channel.data.startswith('GM12'), [value.startswith('GM12') for value in expected])
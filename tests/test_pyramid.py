@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from niftytdms import TdmsOpenFile, TdmsWriter
+
+NUM_VALUES = 200000
+QUERIES = [(100, 5000, 10), (5, 50, 10), (0, NUM_VALUES, 100), (12345, 190001, 37), (1030, 2100, 1), (100, 1223, 1), (3, NUM_VALUES-3, 7)]
+
+
+def AssertEnvelope(envelope, values, start, stop):
+  # every point summarises exactly its own samples inside [start, stop)
+  assert envelope.index[0] == start
+  point_edges = list(envelope.index) + [stop]
+  for i in range(len(envelope)):
+    point_values = values[point_edges[i]:point_edges[i+1]]
+    assert envelope.min[i] == point_values.min()
+    assert envelope.max[i] == point_values.max()
+    assert envelope.mean[i] == pytest.approx(point_values.mean())
+
+
+@pytest.mark.parametrize('with_pyramid', [False, True])
+def test_envelope_is_clipped_to_range(tmp_path, with_pyramid):
+  filepath = str(tmp_path / 'envelope.tdms')
+  values = np.random.default_rng(0).standard_normal(NUM_VALUES)
+  with TdmsWriter(filepath) as writer:
+    for i in range(0, NUM_VALUES, 7000):
+      writer.write_channel('G', 'a', values[i:i+7000])
+  if with_pyramid:
+    with TdmsOpenFile(filepath) as tdms_file:
+      tdms_file.BuildPyramid()
+
+  with TdmsOpenFile(filepath) as tdms_file:
+    assert (tdms_file.FetchPyramid() is not None) == with_pyramid
+    for start, stop, n_points in QUERIES:
+      envelope = tdms_file.channel('G', 'a').envelope(start, stop, n_points)
+      assert len(envelope) == n_points
+      AssertEnvelope(envelope, values, start, stop)
@@ -0,0 +1,116 @@
+import os
+import shutil
+from datetime import datetime, timezone
+
+import numpy as np
+
+from niftytdms import TdmsIndexPath, TdmsLoadFile, TdmsOpenFile, TdmsStringArray, TdmsWriter
+
+
+def test_numeric_channels_round_trip(tmp_path):
+  filepath = str(tmp_path / 'numeric.tdms')
+  parts = [np.arange(i*100, (i+1)*100) for i in range(10)]
+  with TdmsWriter(filepath, segment_size=1000) as writer:
+    for part in parts:
+      writer.write_channel('Group', 'i64', part)
+      writer.write_channel('Group', 'f32', part.astype('>f4'))
+      writer.write_channel('Group', 'bool', part % 3 == 0)
+
+  channel_data = TdmsLoadFile(filepath).groups['Group'].channel_data
+  np.testing.assert_array_equal(channel_data['i64'], np.concatenate(parts))
+  assert channel_data['f32'].dtype == np.float32
+  np.testing.assert_array_equal(channel_data['f32'], np.concatenate(parts).astype(np.float32))
+  assert channel_data['bool'].dtype == bool
+  np.testing.assert_array_equal(channel_data['bool'], np.concatenate(parts) % 3 == 0)
+
+
+def test_strings_written_in_several_calls(tmp_path):
+  filepath = str(tmp_path / 'strings.tdms')
+  with TdmsWriter(filepath) as writer:
+    writer.write_channel('H', 's', ['aa', 'b'])
+    writer.write_channel('H', 's', ['ccc', 'dd'])
+    writer.write_channel('H', 's', TdmsStringArray('xxyzµ'.encode('utf-8'), np.array([1, 2, 2, 6])))   # starts past the buffer's first byte
+
+  channel_data = TdmsLoadFile(filepath).groups['H'].channel_data
+  assert channel_data['s'].tolist() == ['aa', 'b', 'ccc', 'dd', 'x', '', 'yzµ']
+  with TdmsOpenFile(filepath) as tdms_file:
+    assert tdms_file.channel('H', 's')[2:5].tolist() == ['ccc', 'dd', 'x']
+
+
+def test_strings_across_flushes(tmp_path):
+  filepath = str(tmp_path / 'string_segments.tdms')
+  values = ['value ' + str(i)*(i % 7) for i in range(500)]
+  with TdmsWriter(filepath, segment_size=256) as writer:
+    for i in range(0, len(values), 20):
+      writer.write_channel('Log', 'message', values[i:i+20])
+      writer.write_channel('Log', 'code', np.arange(i, i+20, dtype=np.int32))
+
+  channel_data = TdmsLoadFile(filepath).groups['Log'].channel_data
+  assert channel_data['message'].tolist() == values
+  np.testing.assert_array_equal(channel_data['code'], np.arange(500))
+
+
+def test_timestamps_round_trip(tmp_path):
+  filepath = str(tmp_path / 'timestamps.tdms')
+  times = np.datetime64('2024-08-06T16:54:30.123456789', 'ns') + np.arange(1000)*np.timedelta64(1001, 'ns')
+  with TdmsWriter(filepath) as writer:
+    writer.write_channel('Group', 'time', times[:400])
+    writer.write_channel('Group', 'time', times[400:])
+
+  np.testing.assert_array_equal(TdmsLoadFile(filepath).groups['Group'].channel_data['time'], times)
+
+
+def test_properties_and_object_names(tmp_path):
+  filepath = str(tmp_path / 'props.tdms')
+  root_props = {'name': 'run', 'count': 3, 'big': 2**40, 'gain': 1.5, 'enabled': True, 'started': datetime(2024, 1, 2, 3, 4, 5, 123456)}
+  with TdmsWriter(filepath) as writer:
+    writer.write_props(root_props)
+    writer.write_props({'operator': 'µ'}, 'Test Details')
+    writer.write_props({'unit_string': 'bar'}, "it's", 'AI0 - Inlet Gas pressure')
+    writer.write_channel("it's", 'AI0 - Inlet Gas pressure', np.ones(5))
+    writer.write_channel('Test Details', 'Injector ID', ['GM12-J1-FRQ7'])
+
+  root = TdmsLoadFile(filepath)
+  assert root.props == dict(root_props, started=datetime(2024, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc))
+  assert root.groups['Test_Details'].props == {'operator': 'µ'}
+  assert root.groups['Test_Details'].channel_data['Injector_ID'].tolist() == ['GM12-J1-FRQ7']
+  assert root.groups['its'].channel_props['AI0_Inlet_Gas_pressure'] == {'unit_string': 'bar'}
+  np.testing.assert_array_equal(root.groups['its'].channel_data['AI0_Inlet_Gas_pressure'], np.ones(5))
+
+
+def test_index_file(tmp_path):
+  filepath = str(tmp_path / 'indexed.tdms')
+  with TdmsWriter(filepath, segment_size=100, write_index=True) as writer:
+    for i in range(20):
+      writer.write_channel('G', 'a', np.arange(i*10, (i+1)*10))
+      writer.write_channel('G', 's', [str(i)]*3)
+
+  with TdmsOpenFile(filepath) as tdms_file:
+    assert tdms_file.from_index
+    np.testing.assert_array_equal(tdms_file.channel('G', 'a').data, np.arange(200))
+    assert tdms_file.channel('G', 's').data.tolist() == [str(i) for i in range(20) for _ in range(3)]
+
+  data_mtime = os.stat(TdmsIndexPath(filepath)).st_mtime_ns + 10**9   # data finished a moment after the index
+  os.utime(filepath, ns=(data_mtime, data_mtime))
+  with TdmsOpenFile(filepath) as tdms_file:
+    assert tdms_file.from_index
+
+  with TdmsWriter(filepath) as writer:   # rewriting without an index removes the old one
+    writer.write_channel('G', 'a', np.arange(5))
+  assert not os.path.exists(TdmsIndexPath(filepath))
+
+
+def test_stale_index_of_same_size_is_ignored(tmp_path):
+  filepath = str(tmp_path / 'stale.tdms')
+  with TdmsWriter(filepath, write_index=True) as writer:
+    writer.write_channel('G', 'a', np.arange(5, dtype=np.int32))
+  other_path = str(tmp_path / 'other.tdms')
+  with TdmsWriter(other_path) as writer:
+    writer.write_channel('G', 'a', np.arange(5, dtype=np.float32) + 0.5)
+
+  shutil.copyfile(other_path, filepath)
+  index_mtime = os.stat(filepath).st_mtime_ns - 60*10**9   # the index was written well before the rewrite
+  os.utime(TdmsIndexPath(filepath), ns=(index_mtime, index_mtime))
+  with TdmsOpenFile(filepath) as tdms_file:
+    assert not tdms_file.from_index
+    np.testing.assert_array_equal(tdms_file.channel('G', 'a').data, np.arange(5, dtype=np.float32) + 0.5)